@@ -3,32 +3,103 @@ Pixel-scaled drawing canvas, similar to the old VB canvas. This is a thin layer
 much of that documentation (particularly **kwargs) apply here.
 """
 
+import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.lines as lines
+import matplotlib.collections as collections
 import matplotlib.patches as patches
 import matplotlib.image as image
 import matplotlib.text as text
 import matplotlib.transforms as transforms
 import matplotlib.path as path
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
+from contextlib import contextmanager
 from kwanmath.vector import vcomp, vdecomp
 from kwanmath.bezier import arc_l90
 
 class PictureBox():
-    def __init__(self,w,h,title=1,dpi=100,autodraw=True,origin='upper',onscreen=True,**kwargs):
-        if not onscreen:
-            matplotlib.use('Agg')
+    # Initial depth of the transform stack, it grows if push() goes deeper
+    stack_depth=16
+    # Properties which a LineCollection (for strokes) or PolyCollection (for fills) can take,
+    # and the names it takes them by
+    batchable={"stroke":{"color":"color","c":"color","alpha":"alpha","linewidth":"linewidth","lw":"linewidth",
+                         "linestyle":"linestyle","ls":"linestyle"},
+               "fill":{"color":"color","facecolor":"facecolor","fc":"facecolor","edgecolor":"edgecolor",
+                       "ec":"edgecolor","alpha":"alpha","linewidth":"linewidth","lw":"linewidth",
+                       "linestyle":"linestyle","ls":"linestyle"}}
+    def __new__(cls,*args,backend='matplotlib',**kwargs):
+        """
+        Pick the drawing backend.
+
+        :param backend: 'matplotlib' (default) to draw with matplotlib artists on a figure, or 'numpy' to
+                        rasterize directly into an RGBA NumPy framebuffer (see picturebox.raster.RasterBox). The
+                        numpy backend is not generally faster, see picturebox.raster for when it is.
+        """
+        if cls is PictureBox and backend=='numpy':
+            from picturebox.raster import RasterBox
+            cls=RasterBox
+        elif backend not in ('matplotlib','numpy'):
+            raise ValueError(f"Unknown PictureBox backend {backend}")
+        return super().__new__(cls)
+    def __init__(self,w,h,title=1,dpi=100,autodraw=True,origin='upper',onscreen=True,backend='matplotlib',
+                 retained=False,batch=False,affine=False,**kwargs):
+        """
+        :param retained: If true, keep artists from one frame to the next. Each draw call is keyed by its owner
+                         (see own()) and how many draw calls that owner has made so far this frame. On the next
+                         frame, the same draw call updates the artist it made last time in place, and only artists
+                         which were not drawn again by the time of update() are removed.
+        :param batch: If true, consecutive calls to stroke() (and so line() and rectangle()) with exactly the same
+                      style are gathered into a single LineCollection, and likewise consecutive calls to fill()
+                      (and rectangle(fill=True) and fill_many()) into a single PolyCollection, so that many small
+                      primitives cost one artist instead of one each. Paint order is preserved, since only
+                      consecutive calls are batched, and any other drawing or update() or savepng() finishes
+                      the batch.
+        :param onscreen: If false, run headless. The figure is made directly on an Agg canvas, without going
+                         through pyplot, so no window is opened and the GUI event loop is never run. Autodraw
+                         and update() do nothing, since there is nothing to show until savepng().
+        :param affine: If true, M is not applied to the data in Python. Instead, vertices are handed to the artists
+                       untouched, and the artists share one matplotlib Affine2D, self.Mtrans, which holds M
+                       (composed with V in self.MVtrans).
+                       Changing M (with scale(), translate(), rotate(), center() etc.) is then a single update
+                       of that transform, and moves everything already drawn with it.
+
+        Everything drawn with transform=True also goes through the view matrix V, which is applied on top of M.
+        V is the identity unless something sets it, usually a Camera actor.
+        """
         self.w=w
         self.h=h
-        self.fig=plt.figure(title,figsize=(w/dpi,h/dpi),dpi=dpi,**kwargs)
-        self.autodraw=autodraw
-        self.resetM(origin=origin)
+        self.onscreen=onscreen
+        if onscreen:
+            self.fig=plt.figure(title,figsize=(w/dpi,h/dpi),dpi=dpi,**kwargs)
+        else:
+            self.fig=Figure(figsize=(w/dpi,h/dpi),dpi=dpi,**kwargs)
+            FigureCanvasAgg(self.fig)
+        self.autodraw=autodraw and onscreen
+        self.affine=affine
+        self._init_transforms(origin)
         self.zorder=0
-        plt.pause(0.001)
+        self.retained=retained
+        self.artists={}
+        self.own(None)
+        self.drawn=set()
+        self.batch=batch
+        self.batch_style=None
+        self.batch_segs=[]
+        self.batch_trans=None
+        self.pause()
     def __enter__(self):
         return self
     def __exit__(self,exc_type,exc_value,exc_traceback):
-        plt.close(self.fig)
+        if self.onscreen:
+            plt.close(self.fig)
+    def pause(self):
+        """
+        Run the GUI event loop briefly so the window shows what has been drawn. Does nothing when headless.
+        """
+        if self.onscreen:
+            plt.pause(0.001)
     @staticmethod
     def Mtransform(M,xdata,ydata):
         rdata = vcomp((xdata, ydata, 1))
@@ -36,15 +107,226 @@ class PictureBox():
         return vdecomp(Mrdata, m=2)
     def transform(self,xdata,ydata,transform=True):
         if transform:
-            return self.Mtransform(self.M,xdata,ydata)
+            return self.Mtransform(self.V @ self._M,xdata,ydata)
         else:
             return xdata,ydata
+    @property
+    def M(self):
+        # A copy, since the stack slot behind it changes in place, and callers may hold on to it to restore later
+        return self._M.copy()
+    @M.setter
+    def M(self,M):
+        self._M[...]=M
+        self.Mtrans.invalidate()
+    @property
+    def V(self):
+        return self._V
+    @V.setter
+    def V(self,V):
+        self._V=V
+        self.Vtrans.set_matrix(V)
+    def _init_transforms(self,origin):
+        """
+        Set up M, the view matrix V, and the shared transforms which hold them
+        """
+        # M is always the top of this stack, so that push() and pop() don't need to allocate
+        self.Mstack=np.zeros((self.stack_depth,3,3))
+        self.Mtop=0
+        self._M=self.Mstack[0]
+        self.Mtrans=transforms.Affine2D()
+        self.Mtrans.set_matrix(self._M)
+        self.Vtrans=transforms.Affine2D()
+        # M first, then V
+        self.MVtrans=self.Mtrans+self.Vtrans
+        self.Mtranses=[]
+        self.V=np.eye(3)
+        self.resetM(origin=origin)
+    def push(self,M=None):
+        """
+        Save M so that it can be restored by pop(). Anything done to M between the two only lasts until pop().
+
+        :param M: If passed, a matrix for a local frame, which is composed with the current M, so that the
+                  new M transforms from the local frame to pixels.
+        """
+        if self.Mtop+1==len(self.Mstack):
+            self.Mstack=np.concatenate((self.Mstack,np.zeros_like(self.Mstack)))
+        if M is None:
+            self.Mstack[self.Mtop+1]=self._M
+        else:
+            np.matmul(self._M,M,out=self.Mstack[self.Mtop+1])
+        self.Mtop+=1
+        self._M=self.Mstack[self.Mtop]
+        if self.affine:
+            # Artists drawn before the push keep following the old M, so this level gets its own transform
+            self.Mtranses.append((self.Mtrans,self.MVtrans))
+            self.Mtrans=transforms.Affine2D()
+            self.MVtrans=self.Mtrans+self.Vtrans
+        self.Mtrans.set_matrix(self._M)
+    def pop(self):
+        """
+        Restore M to what it was at the matching push()
+        """
+        if self.Mtop==0:
+            raise IndexError("pop() without a matching push()")
+        if self.affine:
+            # The stack slot will be reused, so artists drawn at this level keep a copy of their M
+            self.Mtrans.set_matrix(self._M.copy())
+            self.Mtrans,self.MVtrans=self.Mtranses.pop()
+        self.Mtop-=1
+        self._M=self.Mstack[self.Mtop]
+        self.Mtrans.set_matrix(self._M)
+    @contextmanager
+    def local(self,M=None):
+        """
+        Context manager form of push() and pop(), like:
+
+          with pb.local(pb.Mtranslate(100,100)):
+              pb.line(0,0,10,10)
+
+        :param M: Passed to push()
+        """
+        self.push(M)
+        try:
+            yield self
+        finally:
+            self.pop()
+    def _geometry(self,xdata,ydata,transform=True):
+        """
+        Get coordinates ready to hand to an artist
+
+        :return: Tuple of x, y, and the transform the artist should have. In affine mode the coordinates
+                 are untouched and the transform is the shared self.MVtrans, otherwise the coordinates are
+                 transformed here and the transform is None, meaning the artist draws in pixels.
+        """
+        if self.affine and transform:
+            return xdata,ydata,self.MVtrans
+        Mxdata,Mydata=self.transform(xdata,ydata,transform=transform)
+        return Mxdata,Mydata,None
+    @staticmethod
+    def _with_transform(kwargs,trans):
+        """
+        :return: Artist kwargs with the transform from _geometry() added, if there is one
+        """
+        if trans is None:
+            return kwargs
+        return dict(kwargs,transform=trans)
+    def own(self,owner):
+        """
+        Set the owner of following draw calls, used to key artists in retained mode.
+        :param owner: Any hashable, Actor.draw() uses the actor and whether this is the shadow pass
+        """
+        self.owner=owner
+        self.call_index=0
+    def _next_key(self):
+        """
+        Key for the next draw call in retained mode
+        """
+        key=(self.owner,self.call_index)
+        self.call_index+=1
+        self.drawn.add(key)
+        return key
+    def _artist(self,kind,artists,kwargs,create,update,key=None):
+        """
+        Add an artist to the figure, or in retained mode, reuse the one made by this draw call last frame.
+
+        :param kind: Name of the kind of artist. An artist is only reused for a draw call of the same kind
+                     with the same property names.
+        :param artists: Figure artist list the artist belongs in, like self.fig.lines
+        :param kwargs: Artist properties
+        :param create: Function which takes kwargs and constructs a new artist
+        :param update: Function which takes an existing artist and brings its geometry up to date
+        :param key: Key reserved with _next_key() for this artist, if it was reserved before it was drawn
+        :return: The artist
+        """
+        if not self.retained:
+            artist=create(**kwargs)
+            artists.append(artist)
+            return artist
+        if key is None:
+            key=self._next_key()
+        props=(kind,frozenset(kwargs))
+        if key in self.artists:
+            artist,old_artists,old_props=self.artists[key]
+            if old_props==props:
+                update(artist)
+                artist.set(**kwargs)
+                return artist
+            old_artists.remove(artist)
+        artist=create(**kwargs)
+        artists.append(artist)
+        self.artists[key]=(artist,artists,props)
+        return artist
+    def _sweep(self):
+        """
+        In retained mode, remove all artists that weren't drawn this frame
+        """
+        for key in [key for key in self.artists if key not in self.drawn]:
+            artist,artists,props=self.artists.pop(key)
+            artists.remove(artist)
+    def _batched(self,kind,kwargs,segs,trans=None,force=False):
+        """
+        Add primitives to the pending batch, if batching is on and their style can be batched
+
+        :param kind: "stroke" or "fill"
+        :param kwargs: Style of the primitives
+        :param segs: List of (n,2) vertex arrays, one per primitive
+        :param trans: Transform from _geometry() for the vertices
+        :param force: Batch even if batching is off for this PictureBox
+        :return: True if the primitives were batched, False if they still need to be drawn
+        """
+        if not (self.batch or force) or not all(k in self.batchable[kind] for k in kwargs):
+            return False
+        try:
+            style=(kind,trans is None,frozenset(kwargs.items()))
+        except TypeError:
+            return False
+        # In affine mode each push() level has its own transform, so a batch can't span levels
+        if style!=self.batch_style or trans is not self.batch_trans:
+            self.flush()
+            self.batch_style=style
+            self.batch_kwargs=kwargs
+            self.batch_trans=trans
+            self.batch_zorder=self.zorder
+            self.batch_key=self._next_key() if self.retained else None
+        self.batch_segs+=segs
+        self.zorder+=1
+        return True
+    def flush(self):
+        """
+        Draw the pending batch, if any, as one LineCollection or PolyCollection
+        """
+        if self.batch_style is None:
+            return
+        kind=self.batch_style[0]
+        segs=self.batch_segs
+        kwargs=dict(zorder=self.batch_zorder)
+        for k,v in self.batch_kwargs.items():
+            kwargs[self.batchable[kind][k]]=v
+        kwargs=self._with_transform(kwargs,self.batch_trans)
+        if kind=="stroke":
+            # Line2D has different caps and joins for dashed lines, but a LineCollection only takes one of each
+            ls=kwargs.get("linestyle",mpl.rcParams["lines.linestyle"])
+            style="solid" if lines._get_dash_pattern(ls)[1] is None else "dash"
+            kwargs["capstyle"]=mpl.rcParams[f"lines.{style}_capstyle"]
+            kwargs["joinstyle"]=mpl.rcParams[f"lines.{style}_joinstyle"]
+            self._artist("strokes",self.fig.lines,kwargs,
+                         lambda **kw:collections.LineCollection(segs,figure=self.fig,**kw),
+                         lambda artist:artist.set_segments(segs),key=self.batch_key)
+        else:
+            self._artist("fills",self.fig.lines,kwargs,
+                         lambda **kw:collections.PolyCollection(segs,figure=self.fig,**kw),
+                         lambda artist:artist.set_verts(segs),key=self.batch_key)
+        self.batch_style=None
+        self.batch_segs=[]
+        if self.autodraw:
+            self.pause()
     def plot(self,xdata,ydata,transform=True,**kwargs):
+        self.flush()
         Mxdata,Mydata=self.transform(xdata,ydata,transform=transform)
-        plt.plot(Mxdata,Mydata,zorder=self.zorder,**kwargs)
+        self.fig.gca().plot(Mxdata,Mydata,zorder=self.zorder,**kwargs)
         self.zorder+=1
         if self.autodraw:
-            plt.pause(0.001)
+            self.pause()
     def stroke(self,xdata,ydata,transform=True,**kwargs):
         """
         :param xdata: numpy array of x coordinates
@@ -53,11 +335,16 @@ class PictureBox():
           Passed to the artist constructor. Consider adding things like "color" etc.
         :return: None
         """
-        Mxdata,Mydata=self.transform(xdata,ydata,transform=transform)
-        self.fig.lines.append(lines.Line2D(Mxdata, Mydata,zorder=self.zorder, **kwargs))
+        Mxdata,Mydata,trans=self._geometry(xdata,ydata,transform=transform)
+        if self._batched("stroke",kwargs,[np.column_stack((np.ravel(Mxdata),np.ravel(Mydata)))],trans):
+            return
+        self.flush()
+        self._artist("stroke",self.fig.lines,self._with_transform(dict(zorder=self.zorder,**kwargs),trans),
+                     lambda **kw:lines.Line2D(Mxdata,Mydata,**kw),
+                     lambda artist:artist.set_data(Mxdata,Mydata))
         self.zorder+=1
         if self.autodraw:
-            plt.pause(0.001)
+            self.pause()
     def fill(self,xdata,ydata,transform=True,**kwargs):
         """
         :param path: Iterable of tuples, passed to translate_path
@@ -65,25 +352,74 @@ class PictureBox():
           Passed to the artist constructor. Consider adding things like "color" etc.
         :return: None
         """
-        Mxdata,Mydata=self.transform(xdata,ydata,transform=transform)
-        self.fig.lines.append(patches.Polygon(np.array([Mxdata, Mydata]).T, figure=self.fig, zorder=self.zorder,**kwargs))
+        Mxdata,Mydata,trans=self._geometry(xdata,ydata,transform=transform)
+        xy=np.array([Mxdata, Mydata]).T
+        if self._batched("fill",kwargs,[xy],trans):
+            return
+        self.flush()
+        self._artist("fill",self.fig.lines,self._with_transform(dict(zorder=self.zorder,**kwargs),trans),
+                     lambda **kw:patches.Polygon(xy,figure=self.fig,**kw),
+                     lambda artist:artist.set_xy(xy))
         self.zorder+=1
         if self.autodraw:
-            plt.pause(0.001)
+            self.pause()
+    def fill_many(self,xs,ys,transform=True,**kwargs):
+        """
+        Fill many polygons with the same style as one PolyCollection
+
+        :param xs: Iterable of numpy arrays of x coordinates, one per polygon. Polygons may have different
+                   numbers of vertices, or this may be a 2D array if they all have the same number.
+        :param ys: Iterable of numpy arrays of y coordinates, matching xs
+        :param kwargs:
+          Passed to the PolyCollection constructor. Consider adding things like "color" etc.
+        :return: None
+        """
+        xs=[np.ravel(x) for x in xs]
+        ys=[np.ravel(y) for y in ys]
+        if len(xs)==0:
+            return
+        # Transform all the polygons at once, then split them back up
+        Mxdata,Mydata,trans=self._geometry(np.concatenate(xs),np.concatenate(ys),transform=transform)
+        xy=np.column_stack((np.ravel(Mxdata),np.ravel(Mydata)))
+        polys=np.split(xy,np.cumsum([len(x) for x in xs])[:-1])
+        if self._batched("fill",kwargs,polys,trans,force=True):
+            return
+        self.flush()
+        self._artist("fills",self.fig.lines,self._with_transform(dict(zorder=self.zorder,**kwargs),trans),
+                     lambda **kw:collections.PolyCollection(polys,figure=self.fig,**kw),
+                     lambda artist:artist.set_verts(polys))
+        self.zorder+=1
+        if self.autodraw:
+            self.pause()
     def image(self,x0,y0,x1,y1,imdata,transform=True,**kwargs):
-        Mx,My=self.transform(np.array([x0,x1]),np.array([y0,y1]),transform=transform)
-        bbox=transforms.Bbox(np.array([[Mx[0],My[0]],[Mx[1],My[1]]]))
-        img=image.BboxImage(bbox,**kwargs)
-        img.set_data(imdata)
-        self.fig.images.append(img)
+        self.flush()
+        Mx,My,trans=self._geometry(np.array([x0,x1]),np.array([y0,y1]),transform=transform)
+        corners=np.array([[Mx[0],My[0]],[Mx[1],My[1]]])
+        if trans is None:
+            bbox=transforms.Bbox(corners)
+        else:
+            # Follow the shared transform at draw time. TransformedBbox would un-flip an image that M flips.
+            bbox=lambda renderer:transforms.Bbox(trans.transform(corners))
+        def update(img):
+            img.bbox=bbox
+            img.set_data(imdata)
+        def create(**kw):
+            img=image.BboxImage(bbox,**kw)
+            img.set_data(imdata)
+            return img
+        self._artist("image",self.fig.images,kwargs,create,update)
         if self.autodraw:
-            plt.pause(0.001)
+            self.pause()
     def text(self,x,y,s,**kwargs):
-        Mx,My=self.transform(x,y)
-        txt=text.Text(Mx,My,s,figure=self.fig,**kwargs)
-        self.fig.texts.append(txt)
+        self.flush()
+        Mx,My,trans=self._geometry(x,y)
+        def update(txt):
+            txt.set_position((Mx,My))
+            txt.set_text(s)
+        self._artist("text",self.fig.texts,self._with_transform(kwargs,trans),
+                     lambda **kw:text.Text(Mx,My,s,figure=self.fig,**kw),update)
         if self.autodraw:
-            plt.pause(0.001)
+            self.pause()
     def line(self,x0,y0,x1,y1,**kwargs):
         self.stroke(np.array([x0,x1]),np.array([y0,y1]),**kwargs)
     def rectangle(self,x0,y0,x1,y1,fill=False,**kwargs):
@@ -92,34 +428,80 @@ class PictureBox():
         else:
             self.stroke(np.array([x0,x0,x1,x1,x0]),np.array([y0,y1,y1,y0,y0]),**kwargs)
     def arc(self,xc:float,yc:float,r:float,theta0:float,theta1:float,**kwargs):
+        self.flush()
         while (theta1-theta0)>90:
             self.arc(xc,yc,r,theta0,theta0+90,**kwargs)
             theta0+=90
-        M=self.M @ self.Mtranslate(xc,yc) @ self.Mscale(r,r) @ self.Mrotate(theta0)
+        M=self.Mtranslate(xc,yc) @ self.Mscale(r,r) @ self.Mrotate(theta0)
         Px,Py=vdecomp(arc_l90(np.radians(theta1-theta0)))
-        P=M @ vcomp((Px,Py,1))
-        curve=path.Path(P[0:2,:].T,np.array((path.Path.MOVETO,path.Path.CURVE4,path.Path.CURVE4,path.Path.CURVE4)))
-        self.fig.lines.append(patches.PathPatch(curve,**kwargs))
+        Px,Py,trans=self._geometry(*vdecomp(M @ vcomp((Px,Py,1)),m=2))
+        curve=path.Path(np.column_stack((Px,Py)),
+                        np.array((path.Path.MOVETO,path.Path.CURVE4,path.Path.CURVE4,path.Path.CURVE4)))
+        self._artist("curve",self.fig.lines,self._with_transform(kwargs,trans),
+                     lambda **kw:patches.PathPatch(curve,**kw),
+                     lambda artist:artist.set_path(curve))
         if self.autodraw:
-            plt.pause(0.001)
+            self.pause()
     def bezier(self,x0:float,y0:float,x1:float,y1:float,x2:float,y2:float,x3:float,y3:float,**kwargs):
+        self.flush()
         x=np.array((x0,x1,x2,x3))
-        y=np.array((x0,x1,x2,x3))
-        Mx,My=self.transform(x,y)
+        y=np.array((y0,y1,y2,y3))
+        Mx,My,trans=self._geometry(x,y)
         P=np.zeros((4,2))
         P[:,0]=Mx
         P[:,1]=My
         curve=path.Path(P,np.array((path.Path.MOVETO,path.Path.CURVE4,path.Path.CURVE4,path.Path.CURVE4)))
-        self.fig.lines.append(patches.PathPatch(curve,**kwargs))
+        self._artist("curve",self.fig.lines,self._with_transform(kwargs,trans),
+                     lambda **kw:patches.PathPatch(curve,**kw),
+                     lambda artist:artist.set_path(curve))
         if self.autodraw:
-            plt.pause(0.001)
+            self.pause()
     def savepng(self,oufn,**kwargs):
+        self.flush()
+        if self.retained:
+            self._sweep()
         self.fig.savefig(oufn,**kwargs)
+    def frame(self):
+        """
+        Render the picture and return its pixels, without a round trip through a PNG file
+
+        :return: (h,w,4) uint8 RGBA array, row 0 at the top. This is a view of the Agg renderer's own buffer,
+                 not a copy, so it is only good until the next time the figure is drawn. Copy it to keep it.
+        """
+        self.flush()
+        if self.retained:
+            self._sweep()
+        canvas=self.fig.canvas
+        if not isinstance(canvas,FigureCanvasAgg):
+            # GUI canvas which doesn't draw with Agg. Render with a private Agg canvas, then give the figure back.
+            if not hasattr(self,"agg_canvas"):
+                self.agg_canvas=FigureCanvasAgg(self.fig)
+            self.fig.set_canvas(self.agg_canvas)
+            try:
+                self.agg_canvas.draw()
+            finally:
+                self.fig.set_canvas(canvas)
+            canvas=self.agg_canvas
+        else:
+            canvas.draw()
+        return np.asarray(canvas.buffer_rgba())
     def clear(self):
         self.zorder=0
-        self.fig.clf()
+        self.own(None)
+        self.batch_style=None
+        self.batch_segs=[]
+        if self.retained:
+            # Keep the artists, but drop any axes plot() made
+            self.drawn=set()
+            for ax in list(self.fig.axes):
+                self.fig.delaxes(ax)
+        else:
+            self.fig.clf()
     def update(self):
-        plt.pause(0.001)
+        self.flush()
+        if self.retained:
+            self._sweep()
+        self.pause()
     def resetM(self,origin='upper'):
         """
         Set M back to aligned with the axes and 1 unit=1 pixel
@@ -141,7 +523,9 @@ class PictureBox():
                          [ 0,sy, 0],
                          [ 0, 0, 1]])
     def scale(self,sx,sy):
-        self.M=self.Mscale(sx,sy) @ self.M
+        self._M[0]*=sx
+        self._M[1]*=sy
+        self.Mtrans.invalidate()
     @staticmethod
     def Mtranslate(tx,ty):
         return np.array([[ 1, 0,tx],
@@ -153,7 +537,9 @@ class PictureBox():
         :param tx: Move the origin this many units left
         :param ty: Move the origin this many units up
         """
-        self.M=self.Mtranslate(tx,ty) @ self.M
+        self._M[0]+=tx*self._M[2]
+        self._M[1]+=ty*self._M[2]
+        self.Mtrans.invalidate()
     @staticmethod
     def Mrotate(theta):
         c=np.cos(np.radians(theta))
@@ -162,7 +548,14 @@ class PictureBox():
                          [ s, c, 0],
                          [ 0, 0, 1]])
     def rotate(self,theta):
-        self.M= self.Mrotate(theta)@ self.M
+        c=np.cos(np.radians(theta))
+        s=np.sin(np.radians(theta))
+        x=self._M[0].copy()
+        self._M[0]*=c
+        self._M[0]-=s*self._M[1]
+        self._M[1]*=c
+        self._M[1]+=s*x
+        self.Mtrans.invalidate()
     def center(self,s,origin='upper'):
         """
         Set the matrix such that the origin is at the center
@@ -1,3 +1,4 @@
 from .PictureBox import PictureBox
-from .actor import Actor, EnterActor, Axis, TableColumn, TableGrid, Text, Plot, Function, Field, perform, shadowcolor, linterp, smooth, tc
+from .actor import Actor, EnterActor, Axis, TableColumn, TableGrid, Text, Plot, Function, Field, Camera, ActorIndex, Track, perform, phase_tt, decimate, shadowcolor, linterp, smooth, tc
 from .path import Path
+from .sink import Sink, PNGSink, ThreadedPNGSink, MemmapSink, NpySink, PipeSink
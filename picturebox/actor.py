@@ -6,15 +6,21 @@ their own timelines, then running the render loop explicitly, is quite different
 """
 
 #Python standard libraries
+import bisect
+import inspect
 import os
 import pathlib
+import multiprocessing
+import traceback
 from typing import Callable, Iterable, Tuple
 
 #Other people's libraries
 import numpy as np
+import matplotlib.colors as colors
 
 #My libraries
 from picturebox import PictureBox
+from picturebox.sink import Sink, PNGSink, ThreadedPNGSink, MemmapSink, NpySink
 from kwanmath.interp import linterp
 
 shadowcolor='#a0a0c0'
@@ -30,12 +36,55 @@ def phase_t(ts,f)->Tuple[int,float]:
     :param f: frame number
     :return: tuple of phase and time parameter
     """
-    if f<ts[0]:
-        return 0, linterp(ts[0], 0, ts[1], 1, f)
-    for i_t,t in enumerate(ts[:-2]):
-        if f<ts[i_t+1]:
-            return i_t,linterp(ts[i_t],0,ts[i_t+1],1,f)
-    return len(ts)-1,linterp(ts[-2],0,ts[-1],1,f)
+    # Binary search for the phase, counting how many of the inside phase boundaries have passed
+    i_t=bisect.bisect_right(ts,f,1,len(ts)-1)-1
+    if i_t==len(ts)-2:
+        return len(ts)-1,linterp(ts[-2],0,ts[-1],1,f)
+    return i_t,linterp(ts[i_t],0,ts[i_t+1],1,f)
+
+
+def phase_tt(ts,frames)->Tuple[np.ndarray,np.ndarray]:
+    """
+    Phase and time parameter for a whole range of frames at once, the same as Actor.draw() works them out
+
+    :param ts: Array of phase frame numbers
+    :param frames: Array of frame numbers
+    :return: tuple of arrays of phase and time parameter, each the same shape as frames. Phase is 0 for the
+             entrance and -1 for the exit. Frames before ts[0] are treated as in the entrance and frames at or
+             after ts[-1] as in the exit, with tt extrapolated outside of 0 to 1.
+    """
+    ts=np.asarray(ts,dtype=float)
+    frames=np.asarray(frames,dtype=float)
+    i_phase=np.clip(np.searchsorted(ts,frames,side='right')-1,0,len(ts)-2)
+    t0=ts[i_phase]
+    with np.errstate(divide='ignore',invalid='ignore'):
+        tt=(frames-t0)/(ts[i_phase+1]-t0)
+    return np.where(i_phase==len(ts)-2,-1,i_phase),tt
+
+
+def decimate(x,y,scale=1.0,offset=0.0)->Tuple[np.ndarray,np.ndarray,np.ndarray]:
+    """
+    Pick out the points of a polyline which are needed to draw it at pixel resolution. Each run of consecutive
+    points which land in the same pixel column is cut down to its first, last, lowest, and highest points (min/max
+    decimation). These reach the same extremes as the whole run, though they don't draw exactly the same pixels.
+    Points which aren't finite are always kept, so gaps stay gaps.
+
+    :param x: numpy array of horizontal coordinates
+    :param y: numpy array of vertical coordinates
+    :param scale: Pixel columns per unit of x
+    :param offset: Pixel column of x=0
+    :return: tuple of sorted indices of points to keep, and indices of the first and last point of each run
+    """
+    col=np.floor(x*scale+offset)
+    starts=np.flatnonzero(np.concatenate(([True],col[1:]!=col[:-1])))
+    ends=np.concatenate((starts[1:]-1,[len(col)-1]))
+    run=np.repeat(np.arange(len(starts)),ends-starts+1)
+    keep=[starts,ends,np.flatnonzero(~np.isfinite(y))]
+    for reduce in (np.fmin,np.fmax):
+        hit=np.flatnonzero(y==reduce.reduceat(y,starts)[run])
+        # First point which reaches the extreme in each run
+        keep.append(hit[np.concatenate(([True],run[hit][1:]!=run[hit][:-1]))])
+    return np.unique(np.concatenate(keep)),starts,ends
 
 
 def invert_phase_t(ts, phase, tt) -> float:
@@ -135,6 +184,90 @@ def tc(min,sec,frame):
     """
     return (min*60+sec)*24+frame
 
+
+class Track:
+    """
+    A keyframed value, stored as arrays of keyframe times and values. A track is callable with phase and time
+    parameter like any other keyframable kwarg of an actor, but unlike a lambda it can be called with arrays of
+    phases and times and work out the values for all of them at once, and it can be pickled.
+
+    For example, a cart which rolls to x=500 by frame 30, then back to x=100 by frame 60:
+      Cart(ts=ts,x=Track(ts,[10,30,60],[100,500,100],kind='smooth'))
+    """
+    kinds=('linear','smooth','cubic')
+    def __init__(self,ts,keys,values,kind='linear'):
+        """
+        :param ts: Time points of the actor the track is for, used to turn phase and tt back into frames
+        :param keys: Frame numbers of the keyframes, in order. Before the first and after the last, the value
+                     stays at the first or last keyframe value.
+        :param values: Value at each keyframe. These may be numbers, equal-length vectors, or matplotlib colors,
+                       which are interpolated as RGBA.
+        :param kind: How to get from one keyframe to the next:
+                       'linear' (default) for a straight line
+                       'smooth' to ease in and out of each keyframe with smooth()
+                       'cubic' for a cubic curve through all of the keyframes, with the slope at each one set
+                               by its neighbors (Catmull-Rom style), so the motion doesn't stop at each keyframe
+        """
+        if kind not in self.kinds:
+            raise ValueError(f"Unknown kind of track {kind}, must be one of {self.kinds}")
+        self.ts=np.asarray(ts,dtype=float)
+        self.keys=np.asarray(keys,dtype=float)
+        if len(values)>0 and all(isinstance(value,str) for value in values):
+            values=colors.to_rgba_array(values)
+        self.values=np.asarray(values,dtype=float)
+        if len(self.keys)!=len(self.values) or len(self.keys)==0:
+            raise ValueError("Need one value for each keyframe, and at least one keyframe")
+        self.kind=kind
+        if kind=='cubic':
+            self.slopes=np.zeros_like(self.values)
+            if len(self.keys)>1:
+                with np.errstate(divide='ignore',invalid='ignore'):
+                    dv=np.concatenate((self.values[1:2]-self.values[0:1],self.values[2:]-self.values[:-2],
+                                       self.values[-1:]-self.values[-2:-1]))
+                    dk=np.concatenate((self.keys[1:2]-self.keys[0:1],self.keys[2:]-self.keys[:-2],
+                                       self.keys[-1:]-self.keys[-2:-1]))
+                    self.slopes=np.nan_to_num(dv/dk.reshape((-1,)+(1,)*(self.values.ndim-1)),
+                                              nan=0.0,posinf=0.0,neginf=0.0)
+    def frames(self,phase,tt):
+        """
+        :param phase: Phase, or array of phases, as passed to a keyframed kwarg
+        :param tt: Time parameter, or array of them
+        :return: Frame number, or array of frame numbers, that the phase and tt are from
+        """
+        phase=np.asarray(phase)
+        i_phase=np.where(phase==-1,len(self.ts)-2,phase)
+        t0=self.ts[i_phase]
+        return t0+np.asarray(tt)*(self.ts[i_phase+1]-t0)
+    def at(self,frames):
+        """
+        :param frames: Frame number, or array of frame numbers
+        :return: Value at each frame. The shape is the shape of frames, followed by the shape of one value.
+        """
+        frames=np.asarray(frames,dtype=float)
+        if len(self.keys)==1:
+            return np.broadcast_to(self.values[0],frames.shape+self.values.shape[1:]).copy()[()]
+        i=np.clip(np.searchsorted(self.keys,frames,side='right')-1,0,len(self.keys)-2)
+        k0=self.keys[i]
+        h=self.keys[i+1]-k0
+        with np.errstate(divide='ignore',invalid='ignore'):
+            u=np.clip(np.where(h>0,(frames-k0)/h,1.0),0,1)
+        if self.kind=='smooth':
+            u=smooth(u)
+        # Broadcast over the components of a vector value
+        shape=u.shape+(1,)*(self.values.ndim-1)
+        u=u.reshape(shape)
+        v0=self.values[i]
+        v1=self.values[i+1]
+        if self.kind=='cubic':
+            h=h.reshape(shape)
+            u2=u*u
+            u3=u2*u
+            return ((2*u3-3*u2+1)*v0+(u3-2*u2+u)*h*self.slopes[i]+(-2*u3+3*u2)*v1+(u3-u2)*h*self.slopes[i+1])[()]
+        return (v0+u*(v1-v0))[()]
+    def __call__(self,phase,tt):
+        return self.at(self.frames(phase,tt))
+
+
 class Actor:
     """
     Life is but a walking shadow. A poor player who
@@ -240,15 +373,79 @@ class Actor:
                 self.kwargs[k]=v
         self.kwargs=kwargs
         self.has_shadow=has_shadow
+        self.tables=None
+        self.bindings={}
     def _pop_kwargs(self,kwargs,ks):
         result=[]
         for k in ks:
             result.append(kwargs[k])
             del kwargs[k]
         return tuple(result)
-    def _set_kwargs(self,phase,tt):
+    def _set_kwargs(self,phase,tt,t=None):
+        if self.tables is not None and t is not None:
+            i=t-self.table_f0
+            if 0<=i<self.table_n and i==int(i):
+                for k,table in self.tables.items():
+                    v=table[int(i)]
+                    # Hand back plain Python scalars, so format specs and type checks see what the callable gave
+                    self.kwargs[k]=v.item() if isinstance(v,np.generic) else v
+                return
         for k,f in self.callables.items():
             self.kwargs[k]=f(phase,tt)
+    def precompute(self,f0:int,f1:int):
+        """
+        Evaluate the keyframed kwargs at every frame from f0 up to f1 that the actor is on stage, so that
+        draw() can look them up instead of calling them.
+
+        Each callable is first called once with arrays of phase and tt for all the frames. If that gives an array
+        with a value for each frame, and it agrees with calling it the normal way on the first and last frames,
+        that's the table. Only numeric tables are kept this way -- strings and the like would come back as numpy
+        types. Otherwise it is called one frame at a time, and the table holds whatever it returned.
+        :param f0: First frame
+        :param f1: Frame after the last frame
+        """
+        self.tables=None
+        if self.ts is None or len(self.callables)==0:
+            return
+        # Clamp before converting, since the lifetime may be unbounded, like a Camera's
+        start,end=self.lifetime()
+        f0=int(np.ceil(max(f0,start)))
+        f1=int(np.ceil(min(f1,end)))
+        if f1<=f0:
+            return
+        phases,tts=phase_tt(self.ts,np.arange(f0,f1))
+        tables={}
+        for k,f in self.callables.items():
+            tables[k]=self._table(f,phases,tts)
+        self.table_f0=f0
+        self.table_n=f1-f0
+        self.tables=tables
+    @staticmethod
+    def _table(f,phases,tts):
+        """
+        :return: Array of f(phase,tt) for each phase and tt, see precompute()
+        """
+        def same(a,b):
+            try:
+                return bool(np.allclose(a,b,rtol=1e-12,atol=0))
+            except (TypeError,ValueError):
+                return a is b or a==b
+        first=f(int(phases[0]),float(tts[0]))
+        last=f(int(phases[-1]),float(tts[-1]))
+        try:
+            with np.errstate(all='ignore'):
+                table=np.asarray(f(phases,tts))
+            if table.ndim==0 and table.dtype!=object:
+                table=np.full(len(phases),table)
+            if table.dtype.kind in 'biufc' and len(table)==len(phases) and same(table[0],first) and same(table[-1],last):
+                return table
+        except Exception:
+            pass
+        # Keep exactly what the callable returns, so it's the same as calling it in draw()
+        table=np.empty(len(phases),dtype=object)
+        for i,(phase,tt) in enumerate(zip(phases,tts)):
+            table[i]=f(int(phase),float(tt))
+        return table
     def _enter(self,pb,tt,alpha=1.0,shadow=False,**kwargs):
         """
         Enter the stage. Generally the entrance is short. Good things to do
@@ -282,6 +479,13 @@ class Actor:
         running from fully opaque to fully transparent.
         """
         self._act(pb,phase=-1,tt=1,alpha=alpha*(1-tt),shadow=shadow,**kwargs)
+    def lifetime(self)->Tuple[float,float]:
+        """
+        :return: Time the actor enters the stage, and the time it is gone. draw() does nothing outside of this.
+        """
+        if self.ts is None:
+            return -np.inf,np.inf
+        return self.ts[0],self.ts[-1]
     def draw(self,pb,t,shadow=False):
         """
         Draw the actor on the stage
@@ -294,27 +498,97 @@ class Actor:
         if self.ts is not None:
             if t<self.ts[0] or t>=self.ts[-1] or (shadow and not self.has_shadow):
                 return
-            phase=None
-            for i_phase in range(len(self.ts)-1):
-                if t<self.ts[i_phase+1]:
-                    phase=i_phase
-                    tt = linterp(self.ts[i_phase], 0, self.ts[i_phase+1], 1, t)
-                    break
-            if phase is None:
-                phase=-1
-                tt=1.0
-            if  phase==len(self.ts)-2:
+            phase=bisect.bisect_right(self.ts,t)-1
+            tt=linterp(self.ts[phase],0,self.ts[phase+1],1,t)
+            if phase==len(self.ts)-2:
                 phase=-1
         else:
             phase=1
             tt=0
-        self._set_kwargs(phase, tt)
+        self._set_kwargs(phase,tt,t)
+        pb.own((self,shadow))
         if phase==0:
-            self._enter(pb=pb,tt=tt,shadow=shadow,**self.kwargs)
+            self._call("_enter",pb,phase,tt,shadow)
         elif phase==-1:
-            self._leave(pb=pb,tt=tt,shadow=shadow,**self.kwargs)
+            self._call("_leave",pb,phase,tt,shadow)
         else:
-            self._act(pb=pb,phase=phase,tt=tt,shadow=shadow,**self.kwargs)
+            self._call("_act",pb,phase,tt,shadow)
+    # Arguments draw() passes to each acting method itself, as opposed to from self.kwargs
+    acting_args={"_enter":("pb","tt","shadow"),"_leave":("pb","tt","shadow"),"_act":("pb","phase","tt","shadow")}
+    def _call(self,name,pb,phase,tt,shadow):
+        """
+        Call an acting method with pb, phase (for _act), tt, shadow, and self.kwargs. This does the same as
+        calling it with all keyword arguments, but with a binding from _bind() which lays out the arguments by
+        position, so Python doesn't have to match up every keyword with a parameter on every frame.
+
+        The binding only records where each kwarg goes, and the values are filled in from self.kwargs on every
+        call, so changing a kwarg takes effect on the next frame. Adding or removing one makes a new binding.
+        """
+        binding=self.bindings.get(name)
+        if binding is None or binding[0]!=self.kwargs.keys():
+            binding=self.bindings[name]=self._bind(name)
+        _,method,argv,args,args_extra,keys,keys_extra,extra=binding
+        if method is None:
+            kwargs=dict(pb=pb,phase=phase,tt=tt,shadow=shadow)
+            return getattr(self,name)(**{k:kwargs[k] for k in self.acting_args[name]},**self.kwargs)
+        values=(pb,phase,tt,shadow)
+        for slot,i in args:
+            argv[slot]=values[i]
+        for k,i in args_extra:
+            extra[k]=values[i]
+        kwargs=self.kwargs
+        for slot,k in keys:
+            argv[slot]=kwargs[k]
+        for k in keys_extra:
+            extra[k]=kwargs[k]
+        return method(*argv,**extra)
+    def _bind(self,name):
+        """
+        Look at the signature of an acting method and lay out how to call it by position.
+
+        :return: Tuple of:
+          * Set of the names of the kwargs the binding was made with, so it can be made again if that changes
+          * The bound method, or None if it can't be called by position and has to be called by keyword
+          * List of positional arguments, with defaults already filled in
+          * List of (slot,i) for the arguments from draw(), where i indexes (pb,phase,tt,shadow)
+          * List of (name,i) for the arguments from draw() that go in the method's **kwargs
+          * List of (slot,name) for the kwargs which are passed by position
+          * List of names of the kwargs which go in the method's **kwargs
+          * Dictionary to pass as the method's **kwargs, refilled on every call
+        """
+        fallback=(frozenset(self.kwargs),None,None,None,None,None,None,None)
+        method=getattr(self,name)
+        given=self.acting_args[name]
+        if any(k in self.kwargs for k in given):
+            return fallback
+        params=list(inspect.signature(method).parameters.values())
+        var_keyword=len(params)>0 and params[-1].kind==inspect.Parameter.VAR_KEYWORD
+        if var_keyword:
+            params=params[:-1]
+        if any(param.kind!=inspect.Parameter.POSITIONAL_OR_KEYWORD for param in params):
+            return fallback
+        names=[param.name for param in params]
+        argv=[]
+        args=[]
+        keys=[]
+        for slot,param in enumerate(params):
+            if param.name in given:
+                args.append((slot,("pb","phase","tt","shadow").index(param.name)))
+                argv.append(None)
+            elif param.name in self.kwargs:
+                keys.append((slot,param.name))
+                argv.append(None)
+            elif param.default is not inspect.Parameter.empty:
+                argv.append(param.default)
+            else:
+                return fallback
+        keys_extra=[k for k in self.kwargs if k not in names]
+        if len(keys_extra)>0 and not var_keyword:
+            return fallback
+        args_extra=[(k,("pb","phase","tt","shadow").index(k)) for k in given if k not in names]
+        if len(args_extra)>0 and not var_keyword:
+            return fallback
+        return (frozenset(self.kwargs),method,argv,args,args_extra,keys,keys_extra,{})
 
 class EnterActor(Actor):
     """
@@ -478,6 +752,11 @@ class Plot(EnterActor):
     """
     Draw a this vs that line plot
     """
+    # Bins per pixel column when decimating dense data, or None (default) to always draw every point. Decimation
+    # draws the same extremes in each bin, but not quite the same pixels, so it's something to turn on for
+    # data much denser than the picture, on the class or on one plot. Lines are wider than a pixel, so
+    # whole-pixel columns would lose detail at their edges.
+    decimation=None
     def _enter(self,pb,tt,shadow=False,px0=None,dx0=None,px1=None,dx1=None,data_x=None,py0=None,dy0=None,py1=None,dy1=None,data_y=None,t0=None,t1=None,data_t=None,**kwargs):
         """
         Do the main action for a plot -- draw it in gradually.
@@ -508,15 +787,62 @@ class Plot(EnterActor):
             xofs=0
             yofs=0
         this_t=linterp(0,t0,1,t1,tt)
-        for i,t in enumerate(data_t):
-            if t>this_t:
-                break
-            newx = linterp(dx0, px0, dx1, px1, data_x[i])
-            newy = linterp(dy0, py0, dy1, py1, data_y[i])
-            if i>0 and t>=t0:
-                pb.line(oldx+xofs,oldy+yofs,newx+xofs,newy+yofs,**kwargs)
-            oldx=newx
-            oldy=newy
+        px,py,decimations=self._pixels(px0,dx0,px1,dx1,data_x,py0,dy0,py1,dy1,data_y)
+        data_t=np.asarray(data_t)
+        # Draw from the start of the first segment which ends at or after t0, up to the last point at or before
+        # this_t, then partway along the next segment
+        i0=max(int(np.searchsorted(data_t,t0,side='left')),1)-1
+        n=int(np.searchsorted(data_t,this_t,side='right'))
+        i=self._visible(pb,px,py,decimations,xofs,i0,n)
+        x=px[i]
+        y=py[i]
+        if i0<n<len(data_t) and this_t>data_t[n-1]:
+            frac=(this_t-data_t[n-1])/(data_t[n]-data_t[n-1])
+            x=np.concatenate((x,[px[n-1]+frac*(px[n]-px[n-1])]))
+            y=np.concatenate((y,[py[n-1]+frac*(py[n]-py[n-1])]))
+        if len(x)>=2:
+            pb.stroke(x+xofs,y+yofs,**kwargs)
+    def _pixels(self,px0,dx0,px1,dx1,data_x,py0,dy0,py1,dy1,data_y):
+        """
+        Data transformed to pixels. This is cached, since the data and the scaling are usually the same from one
+        frame to the next. Along with it goes a dictionary of decimations of those pixels, filled in by _visible().
+        """
+        key=(px0,dx0,px1,dx1,py0,dy0,py1,dy1)
+        cache=getattr(self,"pixel_cache",None)
+        if cache is None or cache[0] is not data_x or cache[1] is not data_y or cache[2]!=key:
+            self.pixel_cache=(data_x,data_y,key,
+                              linterp(dx0,px0,dx1,px1,np.asarray(data_x,dtype=float)),
+                              linterp(dy0,py0,dy1,py1,np.asarray(data_y,dtype=float)),{})
+        return self.pixel_cache[3:]
+    def _visible(self,pb,px,py,decimations,xofs,i0,n):
+        """
+        Indices of the points from i0 up to n to draw. If the data are denser than the pixel columns they land in,
+        only the points picked out by decimate() are drawn.
+
+        The decimation depends on how pixels map to columns of the picture box, which only changes when the view
+        does. A shift by whole bins doesn't change it at all, so shadows usually share it with the main line.
+        """
+        T=pb.V @ pb.M
+        if not self.decimation or n-i0<=2 or T[0,0]==0 or T[0,1]!=0:
+            return slice(i0,n)
+        key=(T[0,0]*self.decimation,((T[0,2]+T[0,0]*xofs)*self.decimation)%1)
+        if key not in decimations:
+            if len(decimations)>=8:
+                decimations.clear()
+            keep,starts,ends=decimate(px,py,*key)
+            decimations[key]=(keep,starts,ends) if len(keep)<len(px) else None
+        if decimations[key] is None:
+            return slice(i0,n)
+        keep,starts,ends=decimations[key]
+        i=[keep[np.searchsorted(keep,i0):np.searchsorted(keep,n)],[i0,n-1]]
+        # Runs cut short by either end of the visible part need their own lowest and highest points
+        for a,b in ((i0,ends[np.searchsorted(starts,i0,side='right')-1]+1),
+                    (starts[np.searchsorted(starts,n-1,side='right')-1],n)):
+            a=max(a,i0)
+            b=min(b,n)
+            if np.any(np.isfinite(py[a:b])):
+                i.append([a+np.nanargmin(py[a:b]),a+np.nanargmax(py[a:b])])
+        return np.unique(np.concatenate(i))
 
 class Field(Actor):
     """
@@ -546,36 +872,168 @@ class Field(Actor):
         pb.image(self.px0,self.py0,self.px1,self.py1,self.image,alpha=this_fade)
 
 
-def perform(pb:PictureBox,actors:Iterable[Actor],f0:int,f1:int,oufn_pat:str,shadow:bool=True):
+class Camera(Actor):
+    """
+    Pan, zoom, and rotate the whole scene by setting the view matrix of the PictureBox, which is applied on
+    top of M. A move across the scene is then one matrix update per frame. With an affine PictureBox, the
+    artists already hold their geometry and just follow the shared transform.
+
+    The camera draws nothing. It should be the first actor on the stage, so that the view is set before any
+    other actor draws in the frame. Unlike other actors, it holds its first position before ts[0] and its
+    last position after ts[-1], and it does the same thing on the shadow pass.
+    """
+    def __init__(self,ts=None,**kwargs):
+        """
+        Interesting kwargs, all keyframable:
+
+        :param x: Horizontal pixel position in the scene to put at the center of the frame, default is the center
+        :param y: Vertical pixel position in the scene to put at the center of the frame, default is the center
+        :param zoom: Magnification, default 1.0
+        :param angle: Rotation of the scene around the center of the frame in degrees, default 0.0
+        """
+        super().__init__(ts,has_shadow=False,**kwargs)
+    def lifetime(self)->Tuple[float,float]:
+        return -np.inf,np.inf
+    def draw(self,pb,t,shadow=False):
+        if self.ts is not None:
+            t=min(max(t,self.ts[0]),np.nextafter(self.ts[-1],-np.inf))
+        super().draw(pb,t,shadow=False)
+    def _act(self,pb,phase,tt,alpha=1.0,shadow=False,x=None,y=None,zoom=1.0,angle=0.0,**kwargs):
+        if x is None:
+            x=pb.w/2
+        if y is None:
+            y=pb.h/2
+        pb.V=pb.Mtranslate(pb.w/2,pb.h/2) @ pb.Mrotate(angle) @ pb.Mscale(zoom,zoom) @ pb.Mtranslate(-x,-y)
+
+
+class ActorIndex:
+    """
+    Index of when each actor is on stage, so that a frame only visits the actors which are on stage in it,
+    instead of calling draw() on every actor just for it to return.
+
+    The actors are sorted by the time they enter and by the time they are gone. Going forward in time,
+    active() just moves two places along those lists, adding the actors which have entered since the last
+    call and dropping the ones which have left. Going backward starts over from the beginning.
+    """
+    def __init__(self,actors:Iterable[Actor]):
+        self.actors=list(actors)
+        lifetimes=np.array([actor.lifetime() for actor in self.actors],dtype=float).reshape(-1,2)
+        starts=lifetimes[:,0]
+        ends=np.maximum(lifetimes[:,1],starts)
+        self.by_start=np.argsort(starts,kind='stable')
+        self.starts=starts[self.by_start]
+        self.by_end=np.argsort(ends,kind='stable')
+        self.ends=ends[self.by_end]
+        self.reset()
+    def reset(self):
+        self.t=-np.inf
+        self.n_started=0
+        self.n_ended=0
+        self.on_stage=set()
+        self.cast=None
+    def active(self,t)->list[Actor]:
+        """
+        :param t: Time in frames
+        :return: List of actors on stage at time t, in the same order they were given in
+        """
+        if t<self.t:
+            self.reset()
+        self.t=t
+        n_started=np.searchsorted(self.starts,t,side='right')
+        n_ended=np.searchsorted(self.ends,t,side='right')
+        if n_started>self.n_started or n_ended>self.n_ended:
+            self.on_stage.update(self.by_start[self.n_started:n_started].tolist())
+            self.on_stage.difference_update(self.by_end[self.n_ended:n_ended].tolist())
+            self.n_started=n_started
+            self.n_ended=n_ended
+            self.cast=None
+        if self.cast is None:
+            self.cast=[self.actors[i] for i in sorted(self.on_stage)]
+        return self.cast
+
+
+def perform(pb:PictureBox,actors:Iterable[Actor],f0:int,f1:int,oufn_pat:str=None,shadow:bool=True,sink:Sink=None):
     """
     Draw a collection of actors on a picture box
 
     :param pb: PictureBox to draw on
-    :param actors: Iterable of actors
+    :param actors: Iterable of actors, or an ActorIndex of them
     :param f0: Initial frame to draw
     :param f1: Final frame to draw. In typical Python fashion, this frame number is not actually drawn.
     :param oufn_pat: Pattern for output filenames. Will be used with the % operator with the frame number
     :param shadow: If true, draw the shadow pass in addition to the normal pass.
+    :param sink: Where to put the frames, see picturebox.sink. Default is a PNGSink with oufn_pat.
+    """
+    if sink is None:
+        sink=PNGSink(oufn_pat)
+    if not isinstance(actors,ActorIndex):
+        actors=ActorIndex(actors)
+    with sink.open(pb,f0,f1):
+        perform_frames(pb,actors,f0,f1,sink,shadow=shadow)
+    print("Done")
+
+
+def perform_frames(pb:PictureBox,actors:Iterable[Actor],f0:int,f1:int,sink:Sink,shadow:bool=True):
+    """
+    Draw frames and write them to a sink which is already open. Parameters are as perform().
     """
     for i_frame in range(f0,f1):
         print(f0,i_frame,f1)
-        pb.clear()
-        if shadow:
-            for actor in actors:
-                actor.draw(pb,i_frame,shadow=True)
+        draw_frame(pb,actors,i_frame,shadow=shadow)
+        sink.write(pb,i_frame)
+
+
+def draw_frame(pb:PictureBox,actors:Iterable[Actor],i_frame:int,shadow:bool=True):
+    """
+    Clear the picture box and draw one frame on it. Parameters are as perform().
+    """
+    if isinstance(actors,ActorIndex):
+        actors=actors.active(i_frame)
+    pb.clear()
+    if shadow:
         for actor in actors:
-            actor.draw(pb,i_frame,shadow=False)
-        pb.update()
-        if True:
-            pb.savepng(oufn_pat%i_frame)
-    print("Done")
+            actor.draw(pb,i_frame,shadow=True)
+    for actor in actors:
+        actor.draw(pb,i_frame,shadow=False)
+    pb.update()
 
 
 class Stage:
     w0 = 1280
     h0 = 720
 
-    def __init__(self,w=None,h=None,f0=0,f1=100,shadow=False,facecolor='#e0e0ff',name=None):
+    def __init__(self,w=None,h=None,f0=0,f1=100,shadow=False,facecolor='#e0e0ff',name=None,backend='matplotlib',
+                 retained=False,batch=False,onscreen=True,affine=False,sink='png',encoders=0,queue_depth=8,
+                 workers=1,pool=False,tables=False):
+        """
+        :param backend: PictureBox backend to render with, 'matplotlib' or 'numpy'
+        :param retained: If true, render with a retained-mode PictureBox, which reuses artists between frames
+        :param batch: If true, render with a PictureBox which batches consecutive strokes into LineCollections
+        :param onscreen: If false, render headless, with no window and no GUI event loop
+        :param affine: If true, render with a PictureBox which applies M as a transform shared by all its artists
+        :param sink: Where to put the frames. Either a Sink (see picturebox.sink), or one of these, which are
+                     written in the render/images/<script>/<name>/ folder:
+                       'png' for a PNG file per frame (default)
+                       'memmap' for the raw RGBA pixels of all frames in one <name>.rgba file
+                       'npy' for all frames as one (n_frames,h,w,4) array in <name>.npy
+        :param encoders: With sink='png', the number of background threads to compress the PNG files on while
+                         the next frame is drawn. 0 (default) saves each frame before drawing the next.
+        :param queue_depth: With encoders, the most frames waiting to be compressed at once
+        :param workers: Number of processes to render with. With more than one, the frame range is split into
+                        one contiguous piece per worker. Each worker is forked from this process, so it has its
+                        own copy of the stage and its actors, and makes its own headless PictureBox and calls
+                        setup() on it. This process calls setup() and teardown() once on a PictureBox of its own,
+                        and raises an error if any of the workers fail. Needs an operating system with fork().
+        :param pool: With workers, instead of splitting up the frame range ahead of time, hand out frame numbers
+                     one at a time to a pool of forked workers, which send back the pixels of each frame. This
+                     process writes them to the sink in order, so this works with any sink, and keeps all the
+                     workers busy even if some frames take much longer than others. Only frame numbers and
+                     pixels cross between processes, so actors with lambdas and closures work unchanged.
+                     Used automatically if the sink can't take frames from worker processes.
+        :param tables: If true, before rendering, evaluate the keyframed kwargs of every actor at every frame
+                       it is on stage, and look them up while rendering instead of calling them. See
+                       Actor.precompute().
+        """
         self.actors=[]
         self.w=Stage.w0 if w is None else w
         self.h=Stage.h0 if h is None else h
@@ -583,6 +1041,17 @@ class Stage:
         self.f1=f1
         self.shadow=shadow
         self.facecolor=facecolor
+        self.backend=backend
+        self.retained=retained
+        self.batch=batch
+        self.onscreen=onscreen
+        self.affine=affine
+        self.sink=sink
+        self.encoders=encoders
+        self.queue_depth=queue_depth
+        self.workers=workers
+        self.pool=pool
+        self.tables=tables
         if name is None:
             self.name=type(self).__name__
         else:
@@ -591,6 +1060,14 @@ class Stage:
         pass
     def teardown(self,pb:PictureBox):
         pass
+    def _picturebox(self,onscreen=None):
+        """
+        :param onscreen: Override the onscreen setting of the stage
+        :return: A PictureBox set up the way the stage says
+        """
+        return PictureBox(self.w,self.h,title=self.name,facecolor=self.facecolor,backend=self.backend,
+                          retained=self.retained,batch=self.batch,
+                          onscreen=self.onscreen if onscreen is None else onscreen,affine=self.affine)
     def perform(self,f0=None,f1=None):
         if f0 is None:
             f0=self.f0
@@ -602,8 +1079,129 @@ class Stage:
         oupath=f"render/images/{os.path.basename(__main__.__file__)[:-3]}/{self.name}/"
         pathlib.Path(oupath).mkdir(parents=True,exist_ok=True)
         oufn_pat=oupath+f"{self.name}%0{digits}d.png"
-        with PictureBox(self.w,self.h,title=self.name,facecolor=self.facecolor) as pb:
+        if self.sink=='png' and self.encoders>0:
+            sink=ThreadedPNGSink(oufn_pat,workers=self.encoders,depth=self.queue_depth)
+        elif self.sink=='png':
+            sink=PNGSink(oufn_pat)
+        elif self.sink=='memmap':
+            sink=MemmapSink(oupath+f"{self.name}.rgba")
+        elif self.sink=='npy':
+            sink=NpySink(oupath+f"{self.name}.npy")
+        elif isinstance(self.sink,Sink):
+            sink=self.sink
+        else:
+            raise ValueError(f"Unknown sink {self.sink}")
+        if self.workers>1 and (self.pool or not sink.parallel):
+            self._perform_pool(f0,f1,sink)
+            return
+        if self.workers>1:
+            self._perform_parallel(f0,f1,sink)
+            return
+        with self._picturebox() as pb:
+            self.setup(pb)
+            self._prepare(f0,f1)
+            perform(pb,self.index,f0,f1,shadow=self.shadow,sink=sink)
+            self.teardown(pb)
+    def _prepare(self,f0,f1):
+        """
+        Index the actors, and fill in their tables if asked. Called after setup(), which may add actors, and
+        before any workers are forked, so that they all share the result.
+        """
+        self.index=ActorIndex(self.actors)
+        if self.tables:
+            for actor in self.actors:
+                actor.precompute(f0,f1)
+    def _perform_parallel(self,f0,f1,sink):
+        """
+        Render the frames on forked worker processes, see the workers parameter of the constructor
+        """
+        ctx=multiprocessing.get_context('fork')
+        with self._picturebox(onscreen=False) as pb:
             self.setup(pb)
-            perform(pb,self.actors,f0,f1,shadow=self.shadow,oufn_pat=oufn_pat)
+            self._prepare(f0,f1)
+            with sink.open(pb,f0,f1):
+                procs=[]
+                for frames in np.array_split(np.arange(f0,f1),self.workers):
+                    if len(frames)==0:
+                        continue
+                    recv,send=ctx.Pipe(duplex=False)
+                    proc=ctx.Process(target=self._worker,args=(int(frames[0]),int(frames[-1])+1,sink,send))
+                    proc.start()
+                    send.close()
+                    procs.append((proc,recv))
+                errors=[]
+                for proc,recv in procs:
+                    try:
+                        error=recv.recv()
+                    except EOFError:
+                        error=None
+                    proc.join()
+                    if error is None and proc.exitcode!=0:
+                        error=f"exit code {proc.exitcode}\n"
+                    if error is not None:
+                        errors.append(f"Worker {proc.name} failed: {error}")
+                if len(errors)>0:
+                    raise RuntimeError("".join(errors))
+            print("Done")
             self.teardown(pb)
+    def _perform_pool(self,f0,f1,sink):
+        """
+        Render the frames on a pool of forked worker processes, see the pool parameter of the constructor
+        """
+        global _pool_stage
+        ctx=multiprocessing.get_context('fork')
+        with self._picturebox(onscreen=False) as pb:
+            self.setup(pb)
+            self._prepare(f0,f1)
+            with sink.open(pb,f0,f1):
+                # The workers find the stage here when they fork, so it never has to be pickled
+                _pool_stage=self
+                try:
+                    with ctx.Pool(self.workers) as pool:
+                        for i_frame,frame in zip(range(f0,f1),pool.imap(_pool_frame,range(f0,f1))):
+                            print(f0,i_frame,f1)
+                            sink.write_frame(frame,i_frame)
+                finally:
+                    _pool_stage=None
+            print("Done")
+            self.teardown(pb)
+    def _worker(self,f0,f1,sink,conn):
+        """
+        Body of a worker process -- render frames f0 up to f1, then send None, or the traceback if it failed
+        """
+        try:
+            sink.worker_open()
+            try:
+                with self._picturebox(onscreen=False) as pb:
+                    self.setup(pb)
+                    perform_frames(pb,self.index,f0,f1,sink,shadow=self.shadow)
+            finally:
+                sink.worker_close()
+            conn.send(None)
+        except BaseException:
+            conn.send(traceback.format_exc())
+        conn.close()
 
+
+# Stage being rendered by _perform_pool(), and the PictureBox of this worker process
+_pool_stage=None
+_pool_pb=None
+
+
+def _pool_frame(i_frame:int):
+    """
+    Render one frame in a worker process forked by Stage._perform_pool()
+
+    :return: Copy of the pixels of the frame
+    """
+    global _pool_pb
+    stage=_pool_stage
+    try:
+        if _pool_pb is None:
+            _pool_pb=stage._picturebox(onscreen=False)
+            stage.setup(_pool_pb)
+        draw_frame(_pool_pb,stage.index,i_frame,shadow=stage.shadow)
+        return _pool_pb.frame().copy()
+    except BaseException:
+        # Whatever went wrong might not pickle, so send it back as text
+        raise RuntimeError(f"Frame {i_frame} failed:\n{traceback.format_exc()}") from None
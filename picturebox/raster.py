@@ -0,0 +1,520 @@
+"""
+Pure NumPy raster backend for PictureBox. Rather than building a matplotlib artist for every primitive and then
+paying for savefig on every frame, this draws each primitive straight into a preallocated RGBA framebuffer.
+
+Every primitive is reduced to the edges of a closed outline -- strokes become one quad per line segment, text
+becomes its glyph outlines. Outlines are queued up and scan converted all at once, with nonzero winding, several
+sub-scanlines per pixel row, and exact horizontal coverage along each sub-scanline, so edges are anti-aliased.
+Coverage is then composited in paint order with the source-over operator. A whole batch of primitives is done in
+one set of array operations, so the cost is in the number of sub-scanlines crossed rather than in Python calls.
+
+This is not a fast path in general. It pays off for frames of thousands of small primitives, where it beats
+unbatched matplotlib, and it needs no figure or font rendering machinery. Matplotlib's Agg renderer is compiled,
+so it is quicker at anything with long lines or big fills, and with batch=True it also wins on small primitives.
+Measure before choosing this backend for speed.
+
+Select this backend with PictureBox(w,h,backend='numpy').
+"""
+
+import numpy as np
+import matplotlib as mpl
+import matplotlib.colors as colors
+import matplotlib.image as image
+import matplotlib.lines as lines
+from matplotlib.font_manager import FontProperties
+from matplotlib.textpath import TextPath
+from kwanmath.vector import vcomp, vdecomp
+from kwanmath.bezier import arc_l90
+
+from picturebox.PictureBox import PictureBox
+
+
+def poly_edges(x,y):
+    """
+    Edges of one closed polygon
+    :param x: numpy array of vertex x coordinates
+    :param y: numpy array of vertex y coordinates
+    :return: tuple of x0,y0,x1,y1 arrays, one element per edge, including the edge closing the polygon
+    """
+    x=np.asarray(x,dtype=float).ravel()
+    y=np.asarray(y,dtype=float).ravel()
+    return x,y,np.append(x[1:],x[:1]),np.append(y[1:],y[:1])
+
+
+_next_corner=np.array((1,2,3,0))
+
+
+def stroke_edges(x,y,hw,closed=False,caps=True):
+    """
+    Edges of the outline of a stroked polyline. Each segment becomes a quad extended by the half-width at both
+    ends, which gives projecting caps and fills in the joins. All quads have the same orientation, so the union
+    falls out of nonzero winding.
+
+    :param x: numpy array of vertex x coordinates
+    :param y: numpy array of vertex y coordinates
+    :param hw: half of the line width
+    :param closed: If true, also stroke the segment from the last vertex back to the first
+    :param caps: If true, the ends of the line get projecting caps, otherwise butt caps
+    :return: tuple of x0,y0,x1,y1 edge arrays
+    """
+    x=np.asarray(x,dtype=float).ravel()
+    y=np.asarray(y,dtype=float).ravel()
+    if closed:
+        x=np.append(x,x[0])
+        y=np.append(y,y[0])
+    dx=x[1:]-x[:-1]
+    dy=y[1:]-y[:-1]
+    l=np.hypot(dx,dy)
+    w=l>0
+    if not np.any(w):
+        #Degenerate stroke, draw it as a square dot on the first vertex
+        xa,xb,ya,yb=x[:1],x[:1],y[:1],y[:1]
+        ux,uy=np.ones(1),np.zeros(1)
+    else:
+        xa,xb,ya,yb=x[:-1][w],x[1:][w],y[:-1][w],y[1:][w]
+        ux,uy=dx[w]/l[w],dy[w]/l[w]
+    ex=ux*hw
+    ey=uy*hw
+    # Extension of the start and end of each segment along its direction
+    sx,sy,tx,ty=ex,ey,ex,ey
+    if not caps:
+        sx,sy,tx,ty=sx.copy(),sy.copy(),tx.copy(),ty.copy()
+        sx[0]=sy[0]=tx[-1]=ty[-1]=0
+    qx=np.empty((len(xa),4))
+    qy=np.empty((len(xa),4))
+    qx[:,0]=xa-sx-ey
+    qx[:,1]=xb+tx-ey
+    qx[:,2]=xb+tx+ey
+    qx[:,3]=xa-sx+ey
+    qy[:,0]=ya-sy+ex
+    qy[:,1]=yb+ty+ex
+    qy[:,2]=yb+ty-ex
+    qy[:,3]=ya-sy-ex
+    return qx.ravel(),qy.ravel(),qx[:,_next_corner].ravel(),qy[:,_next_corner].ravel()
+
+
+def dash_spans(l,offset,dashes):
+    """
+    Stretches of a line which are inked by a dash pattern
+
+    :param l: Length of the line
+    :param offset: Distance into the pattern at the start of the line
+    :param dashes: Lengths of the pattern, on, off, on, off...
+    :return: tuple of arrays of the distance along the line of the start and end of each dash
+    """
+    dashes=np.asarray(dashes,dtype=float)
+    if len(dashes)%2==1:
+        # An odd pattern repeats with on and off swapped
+        dashes=np.concatenate((dashes,dashes))
+    ends=np.cumsum(dashes)
+    period=ends[-1]
+    if period<=0:
+        return np.zeros(1),np.full(1,l)
+    starts=ends-dashes
+    phase=offset%period
+    base=np.arange(int(np.ceil((l+phase)/period))+1)[:,None]*period-phase
+    a=np.clip((base+starts[0::2]).ravel(),0,l)
+    b=np.clip((base+ends[0::2]).ravel(),0,l)
+    return a[b>a],b[b>a]
+
+
+def dashed_edges(x,y,hw,offset,dashes,closed=False):
+    """
+    Edges of the outline of a dashed polyline. Each dash is stroked like a polyline of its own, with butt caps
+    like matplotlib draws dashes.
+
+    :param x: numpy array of vertex x coordinates
+    :param y: numpy array of vertex y coordinates
+    :param hw: half of the line width
+    :param offset: Distance into the dash pattern at the start of the line
+    :param dashes: Lengths of the dash pattern, on, off, on, off...
+    :param closed: If true, also stroke the segment from the last vertex back to the first
+    :return: tuple of x0,y0,x1,y1 edge arrays
+    """
+    x=np.asarray(x,dtype=float).ravel()
+    y=np.asarray(y,dtype=float).ravel()
+    if closed:
+        x=np.append(x,x[0])
+        y=np.append(y,y[0])
+    s=np.concatenate(([0],np.cumsum(np.hypot(np.diff(x),np.diff(y)))))
+    pieces=[]
+    for a,b in zip(*dash_spans(s[-1],offset,dashes)):
+        i0=np.searchsorted(s,a,side='right')
+        i1=np.searchsorted(s,b,side='left')
+        dx=np.concatenate(([np.interp(a,s,x)],x[i0:i1],[np.interp(b,s,x)]))
+        dy=np.concatenate(([np.interp(a,s,y)],y[i0:i1],[np.interp(b,s,y)]))
+        pieces.append(stroke_edges(dx,dy,hw,caps=False))
+    if len(pieces)==0:
+        return (np.zeros(0),)*4
+    return tuple(np.concatenate([piece[i] for piece in pieces]) for i in range(4))
+
+
+def coverage(outlines,w,h,ss=4):
+    """
+    Anti-aliased nonzero-winding coverage of a batch of outlines
+
+    :param outlines: List of tuples of x0,y0,x1,y1 edge arrays, one tuple per primitive, in raster coordinates --
+                     x to the right and y down, with pixel (row,col) covering [col,col+1)x[row,row+1). The edges
+                     of each primitive must form closed loops.
+    :param w: Width of the raster in pixels
+    :param h: Height of the raster in pixels
+    :param ss: Number of sub-scanlines sampled per pixel row
+    :return: Tuple of prim,pix,cov arrays with one element per covered pixel of each primitive -- the index of the
+             primitive in outlines, the index of the pixel in the flattened raster, and the coverage in (0,1].
+             Elements are sorted by primitive.
+    """
+    n=np.array([len(e[0]) for e in outlines])
+    prim=np.repeat(np.arange(len(outlines)),n)
+    x0,y0,x1,y1=(np.concatenate([e[i] for e in outlines]) for i in range(4))
+    w_edge=y0!=y1
+    x0,y0,x1,y1,prim=x0[w_edge],y0[w_edge],x1[w_edge],y1[w_edge],prim[w_edge]
+    # Sub-scanline k samples at y=(k+0.5)/ss, and an edge crosses it if ylo<=y<yhi
+    nrow=h*ss
+    k0=np.minimum(np.maximum(np.ceil(np.minimum(y0,y1)*ss-0.5),0),nrow).astype(np.int64)
+    k1=np.minimum(np.maximum(np.ceil(np.maximum(y0,y1)*ss-0.5),0),nrow).astype(np.int64)
+    n=k1-k0
+    e=np.repeat(np.arange(len(n)),n)
+    k=np.arange(len(e))-np.repeat(np.cumsum(n)-n,n)+k0[e]
+    sx=x0[e]+((k+0.5)/ss-y0[e])*(x1[e]-x0[e])/(y1[e]-y0[e])
+    d=np.where(y1[e]>y0[e],1,-1)
+    p=prim[e]
+    # Sort crossings by primitive, then sub-scanline, then x, all packed into one sort key. Clipping x just
+    # outside the raster keeps the order of everything that matters, and leaves room in the key.
+    row_key=p*nrow+k
+    order=np.argsort(row_key*(w+4.0)+np.minimum(np.maximum(sx,-1),w+1)+1)
+    k,sx,d,p=k[order],sx[order],d[order],p[order]
+    # Every sub-scanline crosses a closed outline a net zero times, so a running sum over all the sorted
+    # crossings is the winding number just to the right of each crossing.
+    wind=np.cumsum(d)
+    inside=(wind[:-1]!=0) & (k[:-1]==k[1:]) & (p[:-1]==p[1:])
+    xa=np.minimum(np.maximum(sx[:-1][inside],0),w)
+    xb=np.minimum(np.maximum(sx[1:][inside],0),w)
+    k=k[:-1][inside]
+    p=p[:-1][inside]
+    w_span=xb>xa
+    xa,xb,k,p=xa[w_span],xb[w_span],k[w_span],p[w_span]
+    if len(xa)==0:
+        return np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64),np.zeros(0)
+    # Spans are already grouped by primitive and pixel row. Each group gets its own stretch of an accumulation
+    # buffer, just wide enough for the spans in that row, and each span deposits +1 where it starts and -1 where
+    # it ends, spread over two cells for the fractional part. A cumulative sum then gives coverage, and since
+    # every group nets out to zero, one cumsum over the whole buffer works for all the groups at once.
+    key=p*h+k//ss
+    new_group=np.empty(len(key),dtype=bool)
+    new_group[0]=True
+    new_group[1:]=key[1:]!=key[:-1]
+    g_start=np.flatnonzero(new_group)
+    g=np.cumsum(new_group)-1
+    g_x0=np.floor(np.minimum.reduceat(xa,g_start)).astype(np.int64)
+    g_w=np.ceil(np.maximum.reduceat(xb,g_start)).astype(np.int64)-g_x0+2
+    g_ofs=np.cumsum(g_w)-g_w
+    idx=[]
+    wts=[]
+    for xx,sign in ((xa,1.0/ss),(xb,-1.0/ss)):
+        xx=xx-g_x0[g]
+        ix=np.floor(xx).astype(np.int64)
+        f=xx-ix
+        idx+=[g_ofs[g]+ix,g_ofs[g]+ix+1]
+        wts+=[sign*(1-f),sign*f]
+    acc=np.cumsum(np.bincount(np.concatenate(idx),weights=np.concatenate(wts),minlength=g_ofs[-1]+g_w[-1]))
+    cell=np.flatnonzero(acc>1/512)
+    g=np.searchsorted(g_ofs,cell,side='right')-1
+    col=g_x0[g]+cell-g_ofs[g]
+    w_col=col<w
+    cell,g,col=cell[w_col],g[w_col],col[w_col]
+    g_key=key[g_start][g]
+    return g_key//h,(g_key%h)*w+col,np.minimum(acc[cell],1)
+
+
+class RasterBox(PictureBox):
+    """
+    PictureBox that rasterizes straight into an RGBA NumPy array. This has the same drawing methods as PictureBox,
+    so Actors don't need to know which one they are drawing on. Don't construct this directly, pass backend='numpy'
+    to the PictureBox constructor.
+
+    Drawing is deferred -- outlines are queued and rasterized together when the framebuffer is needed.
+    The framebuffer is self.buf, a (h,w,4) uint8 array with row 0 at the top of the picture.
+    """
+    max_queue=200000
+    def __init__(self,w,h,title=1,dpi=100,autodraw=True,origin='upper',onscreen=True,facecolor='white',ss=4,
+                 backend='numpy',retained=False,batch=False,affine=False,**kwargs):
+        """
+        :param ss: Number of sub-scanlines per pixel row used for anti-aliasing
+        Other parameters are as PictureBox. title, autodraw, and onscreen are accepted but ignored, since there
+        is no figure window to draw on. There are no artists either, so retained, batch, and affine are not
+        supported, and it is an error to turn them on.
+        """
+        for name,value in (("retained",retained),("batch",batch),("affine",affine)):
+            if value:
+                raise ValueError(f"The numpy backend does not support {name}=True")
+        self.w=w
+        self.h=h
+        self.dpi=dpi
+        self.ss=ss
+        self.autodraw=False
+        self.onscreen=False
+        self.affine=False
+        self.facecolor=np.array(colors.to_rgba(facecolor))
+        self.background=np.clip(self.facecolor*255+0.5,0,255).astype(np.uint8).view(np.uint32)[0]
+        self._buf=np.zeros((h,w,4),dtype=np.uint8)
+        self.glyph_cache={}
+        self.queue=[]
+        self.queue_colors=[]
+        self.queue_edges=0
+        self._init_transforms(origin)
+        self.clear()
+    def __exit__(self,exc_type,exc_value,exc_traceback):
+        pass
+    @property
+    def buf(self):
+        self.flush()
+        return self._buf
+    def _pts2px(self,pts):
+        return pts*self.dpi/72
+    def _raster(self,Mxdata,Mydata):
+        """
+        Convert from figure pixel coordinates (origin lower left, +y up) to raster coordinates
+        """
+        return np.asarray(Mxdata,dtype=float),self.h-np.asarray(Mydata,dtype=float)
+    def _over(self,pix,rgba,a):
+        """
+        Composite colors over framebuffer pixels using the source-over operator
+        :param pix: Indexes of pixels in the flattened framebuffer, no repeats allowed
+        :param rgba: (n,4) array of colors
+        :param a: Coverage of each pixel
+        """
+        flat=self._buf.reshape(-1,4)
+        a=a*rgba[:,3]
+        dst=flat[pix].astype(np.float32)/255
+        da=dst[:,3]
+        oa=a+da*(1-a)
+        out=np.empty(dst.shape,dtype=np.float32)
+        out[:,:3]=(rgba[:,:3]*a[:,None]+dst[:,:3]*(da*(1-a))[:,None])/np.where(oa>0,oa,1)[:,None]
+        out[:,3]=oa
+        flat[pix]=np.clip(out*255+0.5,0,255)
+    def flush(self):
+        """
+        Rasterize and composite everything in the queue
+        """
+        if len(self.queue)==0:
+            return
+        prim,pix,a=coverage(self.queue,self.w,self.h,ss=self.ss)
+        rgba=np.array(self.queue_colors,dtype=np.float32)
+        self.queue=[]
+        self.queue_colors=[]
+        self.queue_edges=0
+        if len(pix)==0:
+            return
+        # Where primitives overlap, they have to be composited in order. Number each pixel's coverage entries
+        # in primitive order, then composite all the first entries at once, then all the second, etc.
+        order=np.argsort(pix,kind='stable')
+        prim,pix,a=prim[order],pix[order],a[order].astype(np.float32)
+        first=np.empty(len(pix),dtype=bool)
+        first[0]=True
+        first[1:]=pix[1:]!=pix[:-1]
+        i=np.arange(len(pix))
+        layer=i-np.maximum.accumulate(np.where(first,i,0))
+        order=np.argsort(layer,kind='stable')
+        bounds=np.searchsorted(layer[order],np.arange(layer.max()+2))
+        for j0,j1 in zip(bounds[:-1],bounds[1:]):
+            w=order[j0:j1]
+            self._over(pix[w],rgba[prim[w]],a[w])
+    def _enqueue(self,edges,rgba):
+        self.queue.append(edges)
+        self.queue_colors.append(rgba)
+        self.queue_edges+=len(edges[0])
+        if self.queue_edges>self.max_queue:
+            self.flush()
+    def _stroke_color(self,kwargs):
+        c=kwargs.get("edgecolor",kwargs.get("ec",kwargs.get("color",kwargs.get("c",None))))
+        if c is None:
+            c=mpl.rcParams["lines.color"]
+        return colors.to_rgba(c,kwargs.get("alpha",None))
+    def _fill_color(self,kwargs):
+        c=kwargs.get("facecolor",kwargs.get("fc",kwargs.get("color",kwargs.get("c",None))))
+        if c is None:
+            c=mpl.rcParams["patch.facecolor"]
+        return colors.to_rgba(c,kwargs.get("alpha",None))
+    def _stroke_raster(self,Rx,Ry,closed=False,**kwargs):
+        ls=kwargs.get("linestyle",kwargs.get("ls",mpl.rcParams["lines.linestyle"]))
+        if ls in ('None','none',' ',''):
+            return
+        lw=kwargs.get("linewidth",kwargs.get("lw",mpl.rcParams["lines.linewidth"]))
+        offset,dashes=lines._get_dash_pattern(ls)
+        if dashes is None:
+            edges=stroke_edges(Rx,Ry,self._pts2px(lw)/2,closed=closed)
+        else:
+            if mpl.rcParams["lines.scale_dashes"]:
+                offset,dashes=lines._scale_dashes(offset,dashes,lw)
+            edges=dashed_edges(Rx,Ry,self._pts2px(lw)/2,self._pts2px(offset),self._pts2px(np.asarray(dashes)),
+                               closed=closed)
+            if len(edges[0])==0:
+                return
+        self._enqueue(edges,self._stroke_color(kwargs))
+    def _fill_raster(self,Rx,Ry,**kwargs):
+        self._enqueue(poly_edges(Rx,Ry),self._fill_color(kwargs))
+        # Like a Polygon, which strokes its edge if given an edge color or a color, patch.linewidth wide
+        if any(kwargs.get(k,None) is not None for k in ("edgecolor","ec","color","c")):
+            lw=kwargs.get("linewidth",kwargs.get("lw",mpl.rcParams["patch.linewidth"]))
+            self._stroke_raster(Rx,Ry,closed=True,**dict(kwargs,linewidth=lw))
+    def plot(self,xdata,ydata,transform=True,**kwargs):
+        self.stroke(xdata,ydata,transform=transform,**kwargs)
+    def stroke(self,xdata,ydata,transform=True,**kwargs):
+        Mxdata,Mydata=self.transform(xdata,ydata,transform=transform)
+        self._stroke_raster(*self._raster(Mxdata,Mydata),**kwargs)
+        self.zorder+=1
+    def fill(self,xdata,ydata,transform=True,**kwargs):
+        Mxdata,Mydata=self.transform(xdata,ydata,transform=transform)
+        self._fill_raster(*self._raster(Mxdata,Mydata),**kwargs)
+        self.zorder+=1
+    def fill_many(self,xs,ys,transform=True,**kwargs):
+        xs=[np.ravel(x) for x in xs]
+        ys=[np.ravel(y) for y in ys]
+        if len(xs)==0:
+            return
+        Mxdata,Mydata=self.transform(np.concatenate(xs),np.concatenate(ys),transform=transform)
+        Rx,Ry=self._raster(np.ravel(Mxdata),np.ravel(Mydata))
+        splits=np.cumsum([len(x) for x in xs])[:-1]
+        for Rx_poly,Ry_poly in zip(np.split(Rx,splits),np.split(Ry,splits)):
+            self._fill_raster(Rx_poly,Ry_poly,**kwargs)
+        self.zorder+=1
+    def image(self,x0,y0,x1,y1,imdata,transform=True,alpha=None,cmap=None,norm=None,**kwargs):
+        """
+        Nearest-neighbor resample an image into a box. Like BboxImage, row 0 of imdata is drawn along the y1 edge
+        and column 0 along the x0 edge.
+        :param imdata: 2D array of scalars (colored by cmap and norm) or 3D array of RGB or RGBA
+        :param alpha: Scalar or array with the same shape as the image
+        """
+        Mx,My=self.transform(np.array([x0,x1]),np.array([y0,y1]),transform=transform)
+        Rx,Ry=self._raster(np.ravel(Mx),np.ravel(My))
+        left,right=np.min(Rx),np.max(Rx)
+        top,bottom=np.min(Ry),np.max(Ry)
+        c0=max(int(np.floor(left)),0)
+        c1=min(int(np.ceil(right)),self.w)
+        r0=max(int(np.floor(top)),0)
+        r1=min(int(np.ceil(bottom)),self.h)
+        if r1<=r0 or c1<=c0:
+            return
+        imdata=np.asarray(imdata)
+        if imdata.ndim==2:
+            rgba=mpl.colormaps[cmap if cmap is not None else mpl.rcParams["image.cmap"]] \
+                 ((norm if norm is not None else colors.Normalize())(imdata))
+        else:
+            rgba=imdata.astype(float)
+            if imdata.dtype==np.uint8:
+                rgba/=255
+            if rgba.shape[-1]==3:
+                rgba=np.concatenate((rgba,np.ones(rgba.shape[:2]+(1,))),axis=-1)
+        if alpha is not None:
+            rgba=rgba.copy()
+            rgba[...,3]*=alpha
+        rows=np.arange(r0,r1)
+        cols=np.arange(c0,c1)
+        src_rows=np.clip(((rows+0.5-Ry[1])/(Ry[0]-Ry[1])*rgba.shape[0]).astype(int),0,rgba.shape[0]-1)
+        src_cols=np.clip(((cols+0.5-Rx[0])/(Rx[1]-Rx[0])*rgba.shape[1]).astype(int),0,rgba.shape[1]-1)
+        # Partial coverage of the pixels on the edge of the box
+        cov_r=np.clip(np.minimum(rows+1,bottom)-np.maximum(rows,top),0,1)
+        cov_c=np.clip(np.minimum(cols+1,right)-np.maximum(cols,left),0,1)
+        self.flush()
+        self._over((rows[:,None]*self.w+cols[None,:]).ravel(),
+                   rgba[src_rows[:,None],src_cols[None,:]].reshape(-1,4).astype(np.float32),
+                   (cov_r[:,None]*cov_c[None,:]).ravel().astype(np.float32))
+    def text(self,x,y,s,fontsize=None,size=None,horizontalalignment=None,ha=None,verticalalignment=None,
+             va=None,rotation=0,**kwargs):
+        """
+        Draw text as filled glyph outlines. Supports the alignment and rotation parameters of matplotlib Text.
+        """
+        Mx,My=self.transform(x,y)
+        fontsize=fontsize if fontsize is not None else size if size is not None else mpl.rcParams["font.size"]
+        if not isinstance(fontsize,(int,float)):
+            fontsize=FontProperties(size=fontsize).get_size_in_points()
+        ha=horizontalalignment if horizontalalignment is not None else ha if ha is not None else "left"
+        va=verticalalignment if verticalalignment is not None else va if va is not None else "baseline"
+        glyphs=self._glyphs(s,fontsize,kwargs.get("family",None),ha,va)
+        if glyphs is None:
+            return
+        c=np.cos(np.radians(rotation))
+        s_=np.sin(np.radians(rotation))
+        ox=np.ravel(Mx)[0]
+        oy=self.h-np.ravel(My)[0]
+        # Glyph outlines have +y up, raster coordinates have +y down
+        gx0,gy0,gx1,gy1=glyphs
+        edges=(ox+c*gx0-s_*gy0,oy-s_*gx0-c*gy0,ox+c*gx1-s_*gy1,oy-s_*gx1-c*gy1)
+        c=kwargs.get("color",kwargs.get("c",None))
+        if c is None:
+            c=mpl.rcParams["text.color"]
+        self._enqueue(edges,colors.to_rgba(c,kwargs.get("alpha",None)))
+    def _glyphs(self,s,fontsize,family,ha,va):
+        """
+        Outline edges of a string relative to the text reference point, with +y up, as a tuple of x0,y0,x1,y1
+        arrays, or None if the string has no outline. These are cached, since the same text is usually drawn
+        again on the next frame.
+        """
+        key=(s,fontsize,family,ha,va)
+        if key not in self.glyph_cache:
+            tp=TextPath((0,0),s,size=self._pts2px(fontsize),prop=FontProperties(family=family))
+            polys=tp.to_polygons(closed_only=True)
+            if len(polys)==0:
+                self.glyph_cache[key]=None
+                return None
+            # Vertex extents include Bezier control points, close enough for alignment
+            v=np.concatenate(polys)
+            x0,y0=v.min(axis=0)
+            x1,y1=v.max(axis=0)
+            dx={"left":0,"center":-(x0+x1)/2,"right":-x1}[ha]
+            dy={"baseline":0,"bottom":-y0,"center":-(y0+y1)/2,"center_baseline":-(y0+y1)/2,"top":-y1}[va]
+            edges=[poly_edges(poly[:,0]+dx,poly[:,1]+dy) for poly in polys]
+            self.glyph_cache[key]=tuple(np.concatenate(e) for e in zip(*edges))
+        return self.glyph_cache[key]
+    def _curve(self,P,**kwargs):
+        """
+        Flatten cubic Bezier segments and stroke or fill the result like a PathPatch
+        :param P: (3,N) array of homogeneous figure coordinates, N=1+3*n_segments
+        """
+        t=np.linspace(0,1,33).reshape(-1,1)
+        b=np.stack(((1-t)**3,3*(1-t)**2*t,3*(1-t)*t**2,t**3),axis=1)[...,0]
+        xs=[P[0,:1]]
+        ys=[P[1,:1]]
+        for i in range(0,P.shape[1]-1,3):
+            xs.append((b@P[0,i:i+4])[1:])
+            ys.append((b@P[1,i:i+4])[1:])
+        Rx,Ry=self._raster(np.concatenate(xs),np.concatenate(ys))
+        if kwargs.get("fill",True):
+            self._fill_raster(Rx,Ry,**kwargs)
+        else:
+            kwargs=dict(kwargs)
+            c=kwargs.get("edgecolor",kwargs.get("ec",kwargs.get("color",kwargs.get("c",None))))
+            kwargs["edgecolor"]=c if c is not None else mpl.rcParams["patch.edgecolor"]
+            kwargs["linewidth"]=kwargs.get("linewidth",kwargs.get("lw",mpl.rcParams["patch.linewidth"]))
+            self._stroke_raster(Rx,Ry,**kwargs)
+    def arc(self,xc:float,yc:float,r:float,theta0:float,theta1:float,**kwargs):
+        M=self.V @ self._M @ self.Mtranslate(xc,yc) @ self.Mscale(r,r)
+        segs=[]
+        while (theta1-theta0)>90:
+            segs.append((theta0,90))
+            theta0+=90
+        segs.append((theta0,theta1-theta0))
+        P=[]
+        for i,(th0,dth) in enumerate(segs):
+            Px,Py=vdecomp(arc_l90(np.radians(dth)))
+            Pseg=M @ self.Mrotate(th0) @ vcomp((Px,Py,1))
+            P.append(Pseg if i==0 else Pseg[:,1:])
+        self._curve(np.concatenate(P,axis=1),**kwargs)
+    def bezier(self,x0:float,y0:float,x1:float,y1:float,x2:float,y2:float,x3:float,y3:float,**kwargs):
+        self._curve(self.V @ self._M @ vcomp((np.array((x0,x1,x2,x3)),np.array((y0,y1,y2,y3)),1)),**kwargs)
+    def savepng(self,oufn,**kwargs):
+        image.imsave(oufn,self.buf,**kwargs)
+    def frame(self):
+        """
+        :return: The framebuffer itself, not a copy, so it is only good until the next drawing call or clear()
+        """
+        return self.buf
+    def clear(self):
+        self.zorder=0
+        self.queue=[]
+        self.queue_colors=[]
+        self.queue_edges=0
+        # One 32-bit fill is much quicker than broadcasting four bytes across the buffer
+        self._buf.view(np.uint32).fill(self.background)
+    def update(self):
+        pass
@@ -0,0 +1,216 @@
+"""
+Frame sinks -- places for rendered frames to go. perform() draws each frame, then hands the PictureBox to a sink,
+which can save it as a PNG, copy its pixels into one big file, or stream them to another program.
+"""
+
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import matplotlib.image as image
+
+
+class Sink:
+    """
+    Somewhere to put rendered frames. Subclasses override write_frame(), and write(), open() and close() if they
+    need to. A sink can be used as a context manager, which calls close() at the end.
+
+    When rendering in parallel, open() and close() are called in the main process. Either each forked worker
+    process calls worker_open(), write() for its own frames, then worker_close(), or the workers send the pixels
+    back and the main process calls write_frame() for each frame in order.
+    """
+    # True if write() can be called from forked worker processes, in any order
+    parallel=True
+    def open(self,pb,f0:int,f1:int):
+        """
+        Get ready to receive frames
+
+        :param pb: PictureBox the frames will be drawn on
+        :param f0: First frame number that will be written
+        :param f1: Frame number after the last one that will be written
+        """
+        self.f0=f0
+        self.f1=f1
+        self.w=pb.w
+        self.h=pb.h
+        return self
+    def write(self,pb,i_frame:int):
+        """
+        Take one frame. Called after the frame is completely drawn.
+
+        :param pb: PictureBox with the frame on it
+        :param i_frame: Frame number
+        """
+        self.write_frame(pb.frame(),i_frame)
+    def write_frame(self,frame,i_frame:int):
+        """
+        Take the pixels of one frame
+
+        :param frame: (h,w,4) uint8 RGBA array, as from PictureBox.frame(). Only good until this returns.
+        :param i_frame: Frame number
+        """
+        raise NotImplementedError
+    def close(self):
+        """
+        Finish up after the last frame
+        """
+        pass
+    def worker_open(self):
+        """
+        Get ready to receive frames in a worker process, just after it was forked
+        """
+        pass
+    def worker_close(self):
+        """
+        Finish up in a worker process, after its last frame
+        """
+        pass
+    def __enter__(self):
+        return self
+    def __exit__(self,exc_type,exc_value,exc_traceback):
+        self.close()
+
+
+class PNGSink(Sink):
+    """
+    Save each frame as its own PNG file, the way perform() always has
+    """
+    def __init__(self,oufn_pat:str):
+        """
+        :param oufn_pat: Pattern for output filenames. Will be used with the % operator with the frame number
+        """
+        self.oufn_pat=oufn_pat
+    def write(self,pb,i_frame:int):
+        pb.savepng(self.oufn_pat%i_frame)
+    def write_frame(self,frame,i_frame:int):
+        image.imsave(self.oufn_pat%i_frame,frame)
+
+
+class ThreadedPNGSink(PNGSink):
+    """
+    Save each frame as its own PNG file, but compress and write them on a pool of background threads, so
+    that drawing the next frame overlaps with encoding this one. zlib releases the GIL while it deflates,
+    so the encoders really do run alongside the drawing.
+    """
+    def __init__(self,oufn_pat:str,workers:int=4,depth:int=8):
+        """
+        :param oufn_pat: Pattern for output filenames. Will be used with the % operator with the frame number
+        :param workers: Number of encoder threads
+        :param depth: Most frames waiting to be encoded at once. Each one is a copy of the frame, so this caps
+                      the memory used. When the queue is full, write() waits for an encoder to finish.
+        """
+        super().__init__(oufn_pat)
+        self.workers=workers
+        self.depth=depth
+        self.pool=None
+    def open(self,pb,f0:int,f1:int):
+        super().open(pb,f0,f1)
+        self.open_pool()
+        return self
+    def open_pool(self):
+        self.pool=ThreadPoolExecutor(max_workers=self.workers,thread_name_prefix="PNGSink")
+        self.slots=threading.BoundedSemaphore(self.depth)
+        self.errors=[]
+    def worker_open(self):
+        # Encoder threads don't come along with a fork, so the worker gets its own pool
+        self.open_pool()
+    def worker_close(self):
+        self.close()
+    def _encode(self,oufn,frame):
+        try:
+            image.imsave(oufn,frame)
+        except BaseException as e:
+            self.errors.append(e)
+        finally:
+            self.slots.release()
+    def write(self,pb,i_frame:int):
+        # The frame buffer is reused for the next frame, so the encoder gets a copy
+        self.write_frame(pb.frame().copy(),i_frame)
+    def write_frame(self,frame,i_frame:int):
+        """
+        :param frame: Frame to encode. Unlike other sinks, this one holds on to it, so don't reuse it.
+        """
+        if self.errors:
+            raise self.errors[0]
+        self.slots.acquire()
+        self.pool.submit(self._encode,self.oufn_pat%i_frame,frame)
+    def close(self):
+        if self.pool is None:
+            return
+        self.pool.shutdown(wait=True)
+        self.pool=None
+        if self.errors:
+            raise self.errors[0]
+
+
+class MemmapSink(Sink):
+    """
+    Copy the raw RGBA pixels of every frame into one preallocated memory-mapped file. The file is just the
+    frames one after another, each h rows of w pixels of 4 bytes, with no header.
+    """
+    def __init__(self,oufn:str):
+        """
+        :param oufn: Name of file to write
+        """
+        self.oufn=oufn
+    def shape(self):
+        return (self.f1-self.f0,self.h,self.w,4)
+    def open(self,pb,f0:int,f1:int):
+        super().open(pb,f0,f1)
+        self.frames=np.memmap(self.oufn,dtype=np.uint8,mode='w+',shape=self.shape())
+        return self
+    def write_frame(self,frame,i_frame:int):
+        self.frames[i_frame-self.f0]=frame
+    def close(self):
+        if getattr(self,"frames",None) is not None:
+            self.frames.flush()
+            self.frames=None
+    def worker_close(self):
+        # The map is shared with the main process, which will flush it
+        self.frames.flush()
+
+
+class NpySink(MemmapSink):
+    """
+    Like MemmapSink, but the file is a NumPy .npy file holding an (n_frames,h,w,4) uint8 array,
+    so it can be read back with np.load()
+    """
+    def open(self,pb,f0:int,f1:int):
+        Sink.open(self,pb,f0,f1)
+        self.frames=np.lib.format.open_memmap(self.oufn,mode='w+',dtype=np.uint8,shape=self.shape())
+        return self
+
+
+class PipeSink(Sink):
+    """
+    Write the raw RGBA pixels of every frame to the standard input of another program, like a video encoder.
+    """
+    # The frames have to go down the pipe in order
+    parallel=False
+    def __init__(self,args,**kwargs):
+        """
+        :param args: Command line of the program to run, as a list. In each element, {w} and {h} are replaced with
+                     the size of the frames, so that for instance ffmpeg can be run with
+                     ["ffmpeg","-f","rawvideo","-pix_fmt","rgba","-s","{w}x{h}","-i","-","out.mp4"]
+                     Any other braces are left alone, so filter expressions and code can be passed as they are.
+        :param kwargs: Passed to subprocess.Popen
+        """
+        self.args=args
+        self.kwargs=kwargs
+        self.proc=None
+    def open(self,pb,f0:int,f1:int):
+        super().open(pb,f0,f1)
+        args=[arg.replace("{w}",str(self.w)).replace("{h}",str(self.h)) for arg in self.args]
+        self.proc=subprocess.Popen(args,stdin=subprocess.PIPE,**self.kwargs)
+        return self
+    def write_frame(self,frame,i_frame:int):
+        self.proc.stdin.write(np.ascontiguousarray(frame).data)
+    def close(self):
+        if self.proc is None:
+            return
+        proc=self.proc
+        self.proc=None
+        proc.stdin.close()
+        if proc.wait()!=0:
+            raise subprocess.CalledProcessError(proc.returncode,proc.args)
@@ -1,11 +1,46 @@
 import subprocess
 import os
+import asyncio
+import weakref
+import glob
+import hashlib
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 
-def tex_head(oufn):
+# Everything in the document ahead of the equation
+preamble=r"""\documentclass{minimal} \batchmode
+\usepackage[usenames,dvipsnames,svgnames,table]{xcolor}
+\begin{document}
+"""
+
+# Rendered equations are kept here between runs, up to cache_size bytes of them
+cache_dir=os.environ.get("PICTUREBOX_TEX_CACHE",os.path.join(os.path.expanduser("~"),".cache","picturebox","tex"))
+cache_size=64*1024*1024
+
+# If true, typeset from a precompiled format with the preamble already loaded
+use_format=True
+# Path of the format for each place one might be, or None if it couldn't be built
+_formats={}
+# Only one thread builds the format, the rest wait for it
+_format_lock=threading.Lock()
+
+def doc_head(fmt=None):
+    """
+    Start of the document. With a format, everything before \\begin{document} is already loaded.
+    """
+    if fmt is None:
+        return preamble
+    head,begin,body=preamble.partition(r"\begin{document}")
+    return "\\batchmode\n"+begin+body
+
+def tex_head(oufn,fmt=None):
     ouf=open(oufn+'.tex','wt')
-    print(r"\documentclass{minimal} \batchmode",file=ouf)
-    print(r"\usepackage[usenames,dvipsnames,svgnames,table]{xcolor}",file=ouf)
-    print(r"\begin{document}",file=ouf)
+    print(doc_head(fmt),end='',file=ouf)
     print(r"$$",file=ouf)
     return ouf
 
@@ -14,12 +49,44 @@ def tex_eqn(ouf,text):
 
 def tex_foot(ouf):
     print("$$",file=ouf)
-    print("\end{document}",file=ouf)
+    print(r"\end{document}",file=ouf)
     ouf.close()
 
-def tex_render(oufn,clean=False,verbose=True):
+def tex_pages(oufn,eqns,fmt=None):
+    """
+    Write a document with each equation on its own page
+    """
+    with open(oufn+'.tex','wt') as ouf:
+        print(doc_head(fmt),end='',file=ouf)
+        for eqn in eqns:
+            print(r"$$",file=ouf)
+            tex_eqn(ouf,eqn)
+            print(r"$$",file=ouf)
+            print(r"\newpage",file=ouf)
+        print(r"\end{document}",file=ouf)
+
+def tex_render(oufn,clean=False,verbose=True,pages=None,fmt=None):
+    """
+    Run latex then dvisvgm on a .tex file
+
+    :param oufn: Base name of the files
+    :param clean: If true, delete the intermediate files
+    :param verbose: If false, throw away the output of latex
+    :param pages: If None, the document is one page, and its SVG is returned. Otherwise, the number of pages
+                  in the document, and a list with the SVG of each page is returned.
+    :param fmt: Format from tex_format() the document was written for, or None if it has the whole preamble.
+                If latex fails with the format but works without it, the format isn't used again.
+    :return: SVG as a list of lines, or a list of those if pages is given
+    """
+    cwd,base=tex_dir(oufn)
     # Get the coordinates of the piece by itself
-    subprocess.call("latex "+oufn+".tex"+(" > /dev/null" if not verbose else ""),shell=True)
+    stdout=None if verbose else subprocess.DEVNULL
+    if subprocess.call(latex_args(base,fmt),cwd=cwd,stdout=stdout)!=0 and fmt is not None:
+        # The format may not work with this latex, so try again with the whole preamble, and if that works,
+        # stop using the format
+        without_format(oufn,fmt)
+        if subprocess.call(latex_args(base),cwd=cwd,stdout=stdout)==0:
+            _formats[fmt]=None
     if clean:
         # Delete the .tex since we no longer need it
         os.remove(oufn+'.tex')
@@ -27,23 +94,331 @@ def tex_render(oufn,clean=False,verbose=True):
         os.remove(oufn+'.aux')
         os.remove(oufn+'.log')
     # Render the piece
-    subprocess.call("dvisvgm -e -n -bmin --keep "+oufn+".dvi > /dev/null 2>&1",shell=True)
+    subprocess.call(dvisvgm_args(base,pages),cwd=cwd,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
     # Delete the DVI now that it is rendered
     if clean:
         os.remove(oufn+'.dvi')
-    # Slurp the SVG for this equation
-    with open(oufn+'.svg',"r") as inf:
-        content=inf.readlines()
-    # Delete the SVG
-    if clean:
-        os.remove(oufn+'.svg')
+    return read_svgs(oufn,pages,clean)
+
+def without_format(oufn,fmt):
+    """
+    Rewrite a document written for a format so that it has the whole preamble instead
+    """
+    with open(oufn+'.tex','rt') as inf:
+        body=inf.read()[len(doc_head(fmt)):]
+    with open(oufn+'.tex','wt') as ouf:
+        print(doc_head(),end='',file=ouf)
+        ouf.write(body)
+
+def tex_dir(oufn):
+    """
+    Directory to run latex and dvisvgm in, and the base name of the files there. They write their output to the
+    current directory, so they are run where the .tex is.
+    """
+    path,base=os.path.split(oufn)
+    return (path if path!="" else None),base
+
+def latex_args(base,fmt=None):
+    return ["latex"]+(["-fmt="+fmt] if fmt is not None else [])+[base+".tex"]
+
+def format_args(base):
+    # Load the usual LaTeX format, then base.ini on top of it, which ends by dumping base.fmt
+    return ["latex","-ini","-jobname="+base,"&latex",base+".ini"]
+
+def dvisvgm_args(base,pages=None):
+    if pages is None:
+        return ["dvisvgm","-e","-n","-bmin","--keep",base+".dvi"]
+    # All pages in one go, each to its own file
+    return ["dvisvgm","-e","-n","-bmin","--keep","-p1-","-o",base+"-%p.svg",base+".dvi"]
+
+def read_svgs(oufn,pages=None,clean=False):
+    """
+    Read what dvisvgm wrote, as tex_render() returns it
+    """
+    if pages is None:
+        svgfns=[oufn+'.svg']
+    else:
+        # dvisvgm pads the page numbers with zeros to the width of the page count, so see what it called them
+        found={}
+        for svgfn in glob.glob(glob.escape(oufn)+"-*.svg"):
+            page=svgfn[len(oufn)+1:-4]
+            if page.isdigit():
+                found[int(page)]=svgfn
+        svgfns=[found.get(page,f"{oufn}-{page}.svg") for page in range(1,pages+1)]
+    contents=[]
+    for svgfn in svgfns:
+        # Slurp the SVG for this equation
+        with open(svgfn,"r") as inf:
+            contents.append(inf.readlines())
+        # Delete the SVG
+        if clean:
+            os.remove(svgfn)
+    return contents[0] if pages is None else contents
+
+async def tex_render_async(oufn,pages=None,fmt=None):
+    """
+    Like tex_render(), but the tools run without blocking the event loop. The intermediate files are kept.
+    """
+    cwd,base=tex_dir(oufn)
+    async def run(args):
+        proc=await asyncio.create_subprocess_exec(*args,cwd=cwd,stdout=asyncio.subprocess.DEVNULL,
+                                                  stderr=asyncio.subprocess.DEVNULL)
+        return await proc.wait()
+    if await run(latex_args(base,fmt))!=0 and fmt is not None:
+        without_format(oufn,fmt)
+        if await run(latex_args(base))==0:
+            _formats[fmt]=None
+    await run(dvisvgm_args(base,pages))
+    return read_svgs(oufn,pages)
+
+@lru_cache(maxsize=None)
+def tool_versions():
+    """
+    First line of what each tool says its version is, so that upgrading TeX or dvisvgm misses the cache
+    """
+    versions=[]
+    for tool in ("latex","dvisvgm"):
+        try:
+            out=subprocess.run([tool,"--version"],capture_output=True,text=True).stdout
+        except OSError:
+            out=""
+        versions.append(out.partition("\n")[0])
+    return tuple(versions)
+
+def cache_key(eqn):
+    """
+    Hash of everything which goes into rendering an equation
+    """
+    h=hashlib.sha256()
+    for part in (eqn,preamble)+tool_versions():
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+def cache_get(key):
+    """
+    Rendered SVG from the cache, or None if it isn't there
+    """
+    fn=os.path.join(cache_dir,key+".svg")
+    try:
+        with open(fn,"r") as inf:
+            content=inf.readlines()
+    except FileNotFoundError:
+        return None
+    # Touch it, since eviction goes by modification time. A read-only or shared cache, or another process
+    # evicting it just now, is no reason to throw away what was read.
+    try:
+        os.utime(fn)
+    except OSError:
+        pass
     return content
 
-def eqn2svg(eqn,eqnname="temp"):
-    ouf=tex_head(eqnname)
-    tex_eqn(ouf,eqn)
-    tex_foot(ouf)
-    return tex_render(eqnname)
+def cache_put(key,content):
+    os.makedirs(cache_dir,exist_ok=True)
+    fn=os.path.join(cache_dir,key+".svg")
+    # Write to the side and rename, so that another process never reads half a file
+    tmpfn=f"{fn}.{os.getpid()}.tmp"
+    with open(tmpfn,"w") as ouf:
+        ouf.writelines(content)
+    os.replace(tmpfn,fn)
+    cache_evict()
+
+def cache_evict(size=None):
+    """
+    Delete the least recently used equations from the cache until it is no bigger than size
+
+    :param size: Most bytes to keep, default cache_size
+    """
+    if size is None:
+        size=cache_size
+    entries=[]
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".svg"):
+                try:
+                    stat=entry.stat()
+                except FileNotFoundError:
+                    # Another process evicted it first
+                    continue
+                entries.append((stat.st_mtime,stat.st_size,entry.path))
+    total=sum(entry[1] for entry in entries)
+    for mtime,entry_size,path in sorted(entries):
+        if total<=size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total-=entry_size
+
+def tex_format():
+    """
+    Precompiled LaTeX format with everything in the preamble before \\begin{document} already loaded, so that
+    latex doesn't load the document class and packages all over again for every equation. It is built the first
+    time it is needed and kept in cache_dir.
+
+    :return: Path of the format, or None if use_format is false or the format can't be built. In that case
+             documents carry the whole preamble, like they always did.
+    """
+    if not use_format:
+        return None
+    fmtfn=os.path.join(cache_dir,cache_key("")+".fmt")
+    with _format_lock:
+        if fmtfn not in _formats:
+            if not os.path.exists(fmtfn):
+                try:
+                    with workdir() as oufn:
+                        cwd,base=tex_dir(oufn)
+                        with open(oufn+'.ini','wt') as ouf:
+                            print(preamble.partition(r"\begin{document}")[0]+r"\dump",file=ouf)
+                        subprocess.run(format_args(base),cwd=cwd,stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL,check=True)
+                        # Copy next to where it goes, then rename, so that other processes never see half a format
+                        os.makedirs(cache_dir,exist_ok=True)
+                        tmpfn=f"{fmtfn}.{os.getpid()}.tmp"
+                        shutil.copyfile(oufn+'.fmt',tmpfn)
+                        os.replace(tmpfn,fmtfn)
+                except (OSError,subprocess.CalledProcessError):
+                    _formats[fmtfn]=None
+                    return None
+            _formats[fmtfn]=fmtfn
+        return _formats[fmtfn]
+
+@contextmanager
+def workdir(eqnname=None):
+    """
+    Base name for intermediate files. If eqnname is None, this is in a new private temporary directory, which
+    is deleted afterwards, so that any number of renders can run at once.
+    """
+    if eqnname is not None:
+        yield eqnname
+    else:
+        with tempfile.TemporaryDirectory(prefix="picturebox-tex-") as tmpdir:
+            yield os.path.join(tmpdir,"eqn")
+
+def eqn2svg(eqn,eqnname=None,cache=True):
+    """
+    Typeset an equation and convert it to SVG
+
+    :param eqn: Equation in TeX math mode
+    :param eqnname: Base name of the intermediate files, which are kept. Default is a temporary directory.
+    :param cache: If true, look in the cache in cache_dir first, and save the result there
+    :return: SVG as a list of lines
+    """
+    if cache:
+        key=cache_key(eqn)
+        content=cache_get(key)
+        if content is not None:
+            return content
+    fmt=tex_format()
+    with workdir(eqnname) as oufn:
+        ouf=tex_head(oufn,fmt)
+        tex_eqn(ouf,eqn)
+        tex_foot(ouf)
+        content=tex_render(oufn,fmt=fmt)
+    if cache:
+        cache_put(key,content)
+    return content
+
+def eqns2svg(eqns,eqnname=None,cache=True):
+    """
+    Typeset a whole list of equations and convert them to SVG. They go on separate pages of one document, so
+    latex and dvisvgm only run once no matter how many equations there are.
+
+    :param eqns: List of equations in TeX math mode
+    :param eqnname: Base name of the intermediate files, which are kept. Default is a temporary directory.
+    :param cache: If true, only equations which aren't already in the cache are typeset
+    :return: List of SVGs, each a list of lines, in the same order as eqns
+    """
+    svgs={}
+    if cache:
+        keys={eqn:cache_key(eqn) for eqn in eqns}
+        for eqn,key in keys.items():
+            content=cache_get(key)
+            if content is not None:
+                svgs[eqn]=content
+    # Each different equation only needs to be typeset once
+    todo=[eqn for eqn in dict.fromkeys(eqns) if eqn not in svgs]
+    if len(todo)>0:
+        fmt=tex_format()
+        with workdir(eqnname) as oufn:
+            tex_pages(oufn,todo,fmt)
+            contents=tex_render(oufn,pages=len(todo),fmt=fmt)
+        for eqn,content in zip(todo,contents):
+            svgs[eqn]=content
+            if cache:
+                cache_put(keys[eqn],content)
+    return [svgs[eqn] for eqn in eqns]
+
+# Most equations eqn2svg_async() typesets at once, default one per CPU
+async_workers=None
+# A semaphore only works in the event loop it was first used in, so there is one per loop
+_semaphores=weakref.WeakKeyDictionary()
+
+def _semaphore():
+    loop=asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop]=asyncio.Semaphore(async_workers if async_workers is not None else os.cpu_count())
+    return _semaphores[loop]
+
+async def eqn2svg_async(eqn,cache=True,semaphore=None):
+    """
+    Typeset an equation and convert it to SVG, without blocking the event loop. A scene can start all of its
+    equations with asyncio.gather() or create_task(), then go on setting up while they typeset.
+
+    :param eqn: Equation in TeX math mode
+    :param cache: If true, look in the cache in cache_dir first, and save the result there
+    :param semaphore: Limits how many equations typeset at once. Default is one shared by all calls in this
+                      event loop, allowing async_workers at once.
+    :return: SVG as a list of lines
+    """
+    if cache:
+        key=cache_key(eqn)
+        content=cache_get(key)
+        if content is not None:
+            return content
+    async with (semaphore if semaphore is not None else _semaphore()):
+        # Only slow the first time, when the format is built
+        fmt=await asyncio.to_thread(tex_format)
+        with workdir() as oufn:
+            ouf=tex_head(oufn,fmt)
+            tex_eqn(ouf,eqn)
+            tex_foot(ouf)
+            content=await tex_render_async(oufn,fmt=fmt)
+    if cache:
+        cache_put(key,content)
+    return content
+
+def render_many(eqns,workers=None,cache=True):
+    """
+    Typeset a list of equations on several processes at once. The ones not in the cache are dealt out among
+    the workers, and each worker typesets its share with eqns2svg() in its own temporary directory.
+
+    :param eqns: List of equations in TeX math mode
+    :param workers: Number of worker processes, default one per CPU
+    :param cache: If true, only equations which aren't already in the cache are typeset
+    :return: List of SVGs, each a list of lines, in the same order as eqns
+    """
+    if workers is None:
+        workers=os.cpu_count()
+    svgs={}
+    if cache:
+        for eqn in eqns:
+            content=cache_get(cache_key(eqn))
+            if content is not None:
+                svgs[eqn]=content
+    todo=[eqn for eqn in dict.fromkeys(eqns) if eqn not in svgs]
+    chunks=[todo[i::workers] for i in range(min(workers,len(todo)))]
+    if len(chunks)==1:
+        svgs.update(zip(todo,eqns2svg(todo,cache=cache)))
+    elif len(chunks)>1:
+        # Build the format once here, rather than in every worker
+        tex_format()
+        # Fork, like Stage does, so that workers see the same module settings as this process
+        with ProcessPoolExecutor(len(chunks),mp_context=multiprocessing.get_context("fork")) as pool:
+            for chunk,contents in zip(chunks,pool.map(eqns2svg,chunks,[None]*len(chunks),[cache]*len(chunks))):
+                svgs.update(zip(chunk,contents))
+    return [svgs[eqn] for eqn in eqns]
 
 def test_eqn2svg():
     print(eqn2svg(r"y=\frac{-c \pm \sqrt{d^2-{\color[rgb]{1,0,0}4ef}}}{2g}"))
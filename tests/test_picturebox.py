@@ -1,7 +1,27 @@
 import pytest
 import numpy as np
 import matplotlib.pyplot as plt
-from picturebox import PictureBox
+from picturebox import PictureBox, Actor
+
+
+class Recorder(Actor):
+    """
+    Actor which draws nothing, but remembers the phase, tt, and kwargs it was last called with
+    """
+    def _enter(self,pb,tt,alpha=1.0,shadow=False,**kwargs):
+        self.got=dict(phase=0,tt=tt,**kwargs)
+    def _act(self,pb,phase,tt,alpha=1.0,shadow=False,**kwargs):
+        self.got=dict(phase=phase,tt=tt,**kwargs)
+    def _leave(self,pb,tt,alpha=1.0,shadow=False,**kwargs):
+        self.got=dict(phase=-1,tt=tt,**kwargs)
+
+
+class StrokeRecorder(PictureBox):
+    """
+    PictureBox which remembers the strokes it is asked to draw, instead of drawing them
+    """
+    def stroke(self,x,y,**kwargs):
+        self.strokes.append((np.array(x),np.array(y)))
 
 def test_PictureBox(tmp_path):
     pb=PictureBox(1280,720)
@@ -19,3 +39,623 @@ def test_PictureBox(tmp_path):
     plt.show()
 
 
+
+
+def test_RasterBox(tmp_path):
+    pb=PictureBox(200,100,backend='numpy')
+    assert type(pb).__name__=="RasterBox"
+    assert np.all(pb.buf==255)
+    pb.fill(np.array([10,60,60,10]),np.array([10,10,60,60]),color="#ff0000")
+    #Interior fully covered, outside untouched, corner pixel on the boundary anti-aliased
+    assert tuple(pb.buf[50,30])==(255,0,0,255)
+    assert tuple(pb.buf[5,5])==(255,255,255,255)
+    pb.fill(np.array([10.5,60,60,10.5]),np.array([70,70,80,80]),facecolor="#000000")
+    assert 0<pb.buf[75,10,0]<255
+    #Like a Polygon, a color strokes the edge as well
+    pb.fill(np.array([70.5,90,90,70.5]),np.array([70,70,80,80]),color="#000000")
+    assert pb.buf[75,70,0]==0
+    pb.stroke(np.array([100,190]),np.array([20,20]),color="#0000ff",alpha=0.5)
+    assert tuple(pb.buf[20,150,:3])==(128,128,255)
+    pb.text(100,80,"Hello")
+    pb.arc(150,60,20,0,270,fill=False)
+    pb.image(70,10,90,30,np.arange(16).reshape(4,4))
+    pb.savepng(str(tmp_path/"test_RasterBox.png"))
+    pb.clear()
+    assert np.all(pb.buf==255)
+    with pytest.raises(ValueError,match="batch"):
+        PictureBox(200,100,backend='numpy',batch=True)
+    #Dashes ink about as much of the line as matplotlib's
+    ink={}
+    for backend in ("matplotlib","numpy"):
+        for ls in ("-","--",":"):
+            pb=PictureBox(400,60,onscreen=False,backend=backend)
+            pb.line(20,30,380,30,color="#000000",linestyle=ls,linewidth=2)
+            ink[backend,ls]=np.count_nonzero(pb.frame()[30,:,0]<128)
+    for ls in ("--",":"):
+        assert abs(ink["numpy",ls]/ink["numpy","-"]-ink["matplotlib",ls]/ink["matplotlib","-"])<0.05
+
+
+def test_retained(tmp_path):
+    pb=PictureBox(320,200,title="test_retained",retained=True)
+    for frame in range(3):
+        pb.clear()
+        pb.own("a")
+        pb.line(0,0,100,frame*10,color="#ff0000")
+        pb.text(50,50,f"Frame {frame}",alpha=0.5)
+        if frame<2:
+            pb.own("b")
+            pb.fill(np.array([100,200,200,100]),np.array([100,100,200,200]),color="#ff8000")
+        pb.update()
+        if frame==0:
+            line=pb.fig.lines[0]
+            txt=pb.fig.texts[0]
+        pb.savepng(str(tmp_path/f"test_retained{frame}.png"))
+    #Same artists, updated in place, and the fill that wasn't drawn on the last frame is gone
+    assert pb.fig.lines==[line]
+    assert pb.fig.texts==[txt]
+    assert txt.get_text()=="Frame 2"
+    assert line.get_ydata()[1]==200-20
+    plt.close(pb.fig)
+
+
+def test_batch(tmp_path):
+    pb=PictureBox(320,200,title="test_batch",batch=True)
+    for i in range(5):
+        pb.line(0,i*10,100,i*10,color="#ff0000")
+    pb.line(0,0,100,100,color="#0000ff")
+    for i in range(3):
+        pb.rectangle(100+i*20,100,110+i*20,110,fill=True,color="#ff8000")
+    pb.fill_many([np.array([0,10,10]),np.array([20,30,30,20])],[np.array([0,0,10]),np.array([0,0,10,10])],
+                 color="#ff8000")
+    pb.line(0,0,100,100,color="#0000ff")
+    pb.text(10,10,"Hello")
+    pb.savepng(str(tmp_path/"test_batch.png"))
+    assert [type(artist).__name__ for artist in pb.fig.lines]==["LineCollection","LineCollection","PolyCollection",
+                                                                "LineCollection"]
+    assert len(pb.fig.lines[0].get_segments())==5
+    assert len(pb.fig.lines[2].get_paths())==5
+    assert [artist.get_zorder() for artist in pb.fig.lines]==[0,5,6,10]
+    plt.close(pb.fig)
+    #Dashed lines come out the same batched or not
+    frames=[]
+    for batch in (False,True):
+        pb=PictureBox(320,200,onscreen=False,batch=batch)
+        for i,ls in enumerate(("-","--",":","-.")):
+            pb.line(20,20+i*20,300,20+i*20,color="#000000",linestyle=ls,linewidth=3)
+        frames.append(pb.frame().copy())
+    assert np.all(frames[0]==frames[1])
+
+
+def test_fill_many(tmp_path):
+    for backend in ("matplotlib","numpy"):
+        pb=PictureBox(320,200,title="test_fill_many",backend=backend)
+        x=np.arange(0,300,20).reshape(-1,1)+np.array([[0,10,10,0]])
+        y=np.zeros_like(x)+np.array([[0,0,50,50]])
+        pb.fill_many(x,y,color="#ff0000")
+        pb.savepng(str(tmp_path/f"test_fill_many_{backend}.png"))
+        if backend=="matplotlib":
+            assert len(pb.fig.lines)==1
+            plt.close(pb.fig)
+        else:
+            assert tuple(pb.buf[25,5])==(255,0,0,255)
+            assert tuple(pb.buf[25,15])==(255,255,255,255)
+
+
+def test_headless(tmp_path,monkeypatch):
+    def no_pause(interval):
+        raise AssertionError("plt.pause called while headless")
+    monkeypatch.setattr(plt,"pause",no_pause)
+    with PictureBox(320,200,title="test_headless",onscreen=False) as pb:
+        assert not plt.fignum_exists("test_headless")
+        pb.line(0,0,100,100,color="#ff0000")
+        pb.plot(np.array([0,100]),np.array([100,0]))
+        pb.text(10,10,"Hello")
+        pb.update()
+        pb.savepng(str(tmp_path/"test_headless.png"))
+    assert (tmp_path/"test_headless.png").exists()
+
+
+def test_affine(tmp_path):
+    bufs=[]
+    for affine in (False,True):
+        pb=PictureBox(320,200,title="test_affine",onscreen=False,affine=affine)
+        pb.center(10)
+        pb.line(-5,-5,5,5,color="#ff0000",linewidth=3)
+        pb.rectangle(1,1,4,4,fill=True,color="#ff8000")
+        pb.image(-8,-8,-4,-4,np.arange(16).reshape(4,4))
+        pb.arc(0,0,3,0,270,fill=False)
+        pb.text(0,0,"Hello")
+        pb.savepng(str(tmp_path/f"test_affine{affine}.png"))
+        pb.fig.canvas.draw()
+        bufs.append(np.asarray(pb.fig.canvas.buffer_rgba()).copy())
+    #Same picture either way, but in affine mode vertices are stored untouched
+    assert np.all(bufs[0]==bufs[1])
+    assert np.all(pb.fig.lines[0].get_xydata()==[[-5,-5],[5,5]])
+    #and changing M moves everything already drawn
+    pb.translate(10,0)
+    assert np.allclose(pb.fig.lines[0].get_transform().transform([[0,0]]),[[170,100]])
+
+
+def test_camera():
+    from picturebox import Camera
+    pb=PictureBox(320,200,title="test_camera",onscreen=False,affine=True)
+    pb.line(0,0,160,100)
+    line=pb.fig.lines[0]
+    camera=Camera(ts=[0,10,20,30],zoom=lambda phase,tt:2.0 if phase==1 else 1.0,x=lambda phase,tt:160+10*tt)
+    camera.draw(pb,-5)
+    assert np.allclose(pb.V,np.eye(3))
+    camera.draw(pb,15)
+    #Scene point (165,100) is in the center of the frame, at double size
+    assert np.allclose(pb.transform(165,200-100),(160,100))
+    assert np.allclose(line.get_transform().transform([[155,100]]),[[140,100]])
+    camera.draw(pb,40)
+    assert np.allclose(pb.transform(170,100),(160,100))
+
+
+def test_push_pop():
+    for affine in (False,True):
+        pb=PictureBox(320,200,title="test_push_pop",onscreen=False,affine=affine)
+        M=pb.M.copy()
+        pb.scale(2,3)
+        pb.rotate(30)
+        pb.translate(5,7)
+        assert np.allclose(pb.M,pb.Mtranslate(5,7)@pb.Mrotate(30)@pb.Mscale(2,3)@M)
+        M=pb.M.copy()
+        with pb.local(pb.Mtranslate(10,0)):
+            assert np.allclose(pb.transform(0,0),pb.Mtransform(M,10,0))
+            pb.line(0,0,1,1)
+            pb.push()
+            pb.scale(2,2)
+            pb.pop()
+            assert np.allclose(pb.transform(0,0),pb.Mtransform(M,10,0))
+        assert np.allclose(pb.M,M)
+        with pytest.raises(IndexError):
+            pb.pop()
+        for i in range(pb.stack_depth*2):
+            pb.push(pb.Mtranslate(1,0))
+        assert np.allclose(pb.transform(0,0),pb.Mtransform(M,pb.stack_depth*2,0))
+        if affine:
+            # The line drawn in the local frame stays put as the stack slot it used is reused
+            assert np.allclose(pb.fig.lines[0].get_transform().transform([[0,0]]),[pb.Mtransform(M,10,0)])
+        #M is a copy, so it can be saved and restored around changes
+        saved=pb.M
+        pb.scale(2,2)
+        pb.M=saved
+        assert np.allclose(pb.M,saved)
+    #Batches don't carry across push() in affine mode, where each level has its own transform
+    pb=PictureBox(320,200,title="test_push_pop",onscreen=False,affine=True,batch=True)
+    pb.line(0,0,0,10,color="#ff0000")
+    with pb.local(pb.Mtranslate(100,0)):
+        pb.line(0,0,0,10,color="#ff0000")
+    pb.flush()
+    assert len(pb.fig.lines)==2
+    assert np.allclose(pb.fig.lines[1].get_transform().transform([[0,0]]),[pb.transform(100,0)])
+
+
+def test_frame(tmp_path):
+    for backend in ("matplotlib","numpy"):
+        pb=PictureBox(320,200,title="test_frame",onscreen=False,backend=backend)
+        pb.fill(np.array([10,60,60,10]),np.array([10,10,60,60]),color="#ff0000")
+        pb.text(100,100,"Hello")
+        frame=pb.frame()
+        assert frame.shape==(200,320,4) and frame.dtype==np.uint8
+        assert tuple(frame[30,30])==(255,0,0,255)
+        #No copy, the next frame lands in the same memory
+        assert np.shares_memory(frame,pb.frame())
+        pb.savepng(str(tmp_path/f"test_frame_{backend}.png"))
+        assert np.all(np.round(plt.imread(str(tmp_path/f"test_frame_{backend}.png"))*255)==frame)
+
+
+def test_sinks(tmp_path):
+    import sys
+    from picturebox import perform, ThreadedPNGSink, MemmapSink, NpySink, PipeSink
+    class Bar(Actor):
+        def _act(self,pb,phase,tt,alpha=1.0,shadow=False,**kwargs):
+            pb.rectangle(0,0,tt*100,10,fill=True,color="#ff0000")
+    pb=PictureBox(160,100,title="test_sinks",onscreen=False)
+    #Braces other than {w} and {h} go through as they are
+    copy=[sys.executable,"-c",f"import sys;open({str(tmp_path/'pipe.rgba')!r},'wb').write(sys.stdin.buffer.read());"
+                              f"open({str(tmp_path/'size.txt')!r},'w').write('%s' % {{'size':sys.argv[1]}})","{w}x{h}"]
+    for sink in (MemmapSink(str(tmp_path/"frames.rgba")),NpySink(str(tmp_path/"frames.npy")),PipeSink(copy),
+                 ThreadedPNGSink(str(tmp_path/"frame%02d.png"),workers=2,depth=2)):
+        perform(pb,[Bar(ts=[0,1,11,12])],2,7,sink=sink)
+    frames=np.load(str(tmp_path/"frames.npy"))
+    assert frames.shape==(5,100,160,4)
+    assert tuple(frames[4,5,45])==(255,0,0,255) and tuple(frames[4,5,55])==(255,255,255,255)
+    assert (tmp_path/"size.txt").read_text()=="{'size': '160x100'}"
+    for fn in ("frames.rgba","pipe.rgba"):
+        assert np.all(np.fromfile(str(tmp_path/fn),dtype=np.uint8).reshape(frames.shape)==frames)
+    for i in range(5):
+        assert np.all(np.round(plt.imread(str(tmp_path/f"frame{i+2:02d}.png"))*255)==frames[i])
+
+
+def test_workers(tmp_path,monkeypatch):
+    from picturebox.actor import Stage
+    class Bar(Actor):
+        def _act(self,pb,phase,tt,alpha=1.0,shadow=False,x=None,**kwargs):
+            if x>150:
+                raise ValueError("Bar ran off the edge")
+            pb.rectangle(0,0,x,10,fill=True,color="#ff0000")
+    #Actors added in setup() are drawn too
+    class BarStage(Stage):
+        def setup(self,pb):
+            self.actors.append(Bar(ts=[0,1,11,12],x=lambda phase,tt:tt*100))
+    monkeypatch.chdir(tmp_path)
+    frames={}
+    for workers,pool in ((1,False),(3,False),(3,True)):
+        name=f"workers{workers}{pool}"
+        stage=BarStage(160,100,f0=0,f1=10,name=name,onscreen=False,sink='npy',workers=workers,pool=pool)
+        stage.perform()
+        frames[workers,pool]=np.load(next(tmp_path.glob(f"render/images/*/{name}/{name}.npy")))
+    assert np.all(frames[1,False][5,5,:5]==[255,0,0,255])
+    assert np.all(frames[1,False]==frames[3,False])
+    assert np.all(frames[1,False]==frames[3,True])
+    for pool in (False,True):
+        stage=Stage(160,100,f0=0,f1=10,name="fail",onscreen=False,sink='npy',workers=3,pool=pool)
+        stage.actors.append(Bar(ts=[0,1,11,12],x=lambda phase,tt:tt*200))
+        with pytest.raises(RuntimeError,match="Bar ran off the edge"):
+            stage.perform()
+
+
+def test_actor_index():
+    from picturebox import Camera
+    from picturebox.actor import ActorIndex
+    rng=np.random.default_rng(14)
+    actors=[]
+    for i in range(300):
+        t0=rng.integers(0,100)
+        actors.append(Actor(ts=np.cumsum([t0,*rng.integers(0,10,3)])))
+    actors.append(Actor())
+    actors.append(Camera(ts=[40,50]))
+    index=ActorIndex(actors)
+    for t in [*range(-5,120),50,10.5,*range(30,60)]:
+        assert index.active(t)==[actor for actor in actors if actor.ts is None or isinstance(actor,Camera) or
+                                 actor.ts[0]<=t<actor.ts[-1]]
+
+
+def test_phase_tt():
+    from picturebox import phase_tt
+    from picturebox.actor import phase_t
+    ts=[10,20,20,35,50,60]
+    frames=np.arange(0,70)
+    phase,tt=phase_tt(ts,frames)
+    actor=Recorder(ts=ts)
+    pb=PictureBox(10,10,backend='numpy')
+    for f in frames:
+        if ts[0]<=f<ts[-1]:
+            actor.draw(pb,f)
+            assert (actor.got["phase"],actor.got["tt"])==(phase[f],tt[f])
+    assert phase[0]==0 and tt[0]==-1 and phase[65]==-1 and tt[65]==1.5
+    #Old linear scan
+    def old_phase_t(ts,f):
+        if f<ts[0]:
+            return 0,(f-ts[0])/(ts[1]-ts[0])
+        for i_t in range(len(ts)-2):
+            if f<ts[i_t+1]:
+                return i_t,(f-ts[i_t])/(ts[i_t+1]-ts[i_t])
+        return len(ts)-1,(f-ts[-2])/(ts[-1]-ts[-2])
+    for f in frames:
+        assert phase_t(ts,f)==old_phase_t(ts,f)
+
+
+def test_tables():
+    pb=PictureBox(10,10,backend='numpy')
+    kwargs=dict(x=lambda phase,tt:100+10*tt,
+                color=lambda phase,tt:np.array([tt,0,0]),
+                s=lambda phase,tt:f"phase {phase} {tt:.2f}",
+                big=lambda phase,tt:2.0 if phase==1 else 1.0,
+                f=lambda phase,tt:(lambda x:x*tt),
+                k=lambda phase,tt:7,
+                width=3)
+    plain=Recorder(ts=[10,20,20,35,50,60],**kwargs)
+    tabled=Recorder(ts=[10,20,20,35,50,60],**kwargs)
+    tabled.precompute(0,55)
+    assert tabled.tables["x"].dtype==float and tabled.tables["s"].dtype==object
+    assert tabled.tables["big"].dtype==object and tabled.tables["k"].dtype==int
+    for t in range(5,65):
+        if 10<=t<60:
+            plain.draw(pb,t)
+            tabled.draw(pb,t)
+            for k,v in plain.got.items():
+                assert type(v)==type(tabled.got[k])
+                if k=="f":
+                    assert v(3)==tabled.got[k](3)
+                else:
+                    assert np.all(v==tabled.got[k])
+    #A camera is on stage forever, so its table covers just the frames asked for
+    from picturebox import Camera
+    plain=Camera(ts=[10,20,30,40],x=lambda phase,tt:100+10*tt,zoom=lambda phase,tt:1+tt)
+    tabled=Camera(ts=[10,20,30,40],x=lambda phase,tt:100+10*tt,zoom=lambda phase,tt:1+tt)
+    tabled.precompute(0,55)
+    assert tabled.table_f0==0 and tabled.table_n==55
+    for t in range(0,60):
+        plain.draw(pb,t)
+        V=pb.V.copy()
+        tabled.draw(pb,t)
+        assert np.allclose(V,pb.V)
+
+
+def test_table_column(tmp_path,monkeypatch):
+    from picturebox.actor import Stage, TableColumn
+    monkeypatch.chdir(tmp_path)
+    frames={}
+    for tables in (False,True):
+        name=f"tables{tables}"
+        stage=Stage(160,100,f0=0,f1=30,name=name,onscreen=False,sink='npy',tables=tables)
+        stage.actors.append(TableColumn(ts=[0,10,20,30],x=10,y0=10,dy=10,header=lambda phase,tt:"Total",
+                                        data=[1,2,3]))
+        stage.perform()
+        frames[tables]=np.load(next(tmp_path.glob(f"render/images/*/{name}/{name}.npy")))
+    assert np.all(frames[False]==frames[True])
+
+
+def test_track():
+    import pickle
+    from picturebox import Track, phase_tt
+    ts=[0,10,50,60]
+    frames=np.arange(-5,70)
+    phases,tts=phase_tt(ts,frames)
+    keys=[10,30,40,50]
+    x=Track(ts,keys,[100,500,500,0])
+    assert np.allclose(x(phases,tts),np.interp(frames,keys,[100,500,500,0]))
+    assert x(1,0.5)==500
+    xy=Track(ts,keys,[[0,0],[10,20],[30,40],[0,0]],kind='smooth')
+    assert xy(phases,tts).shape==(len(frames),2)
+    assert np.allclose(xy.at(20),[5,10])
+    cubic=Track(ts,keys,[0,1,3,0],kind='cubic')
+    assert np.allclose(cubic.at(keys),[0,1,3,0])
+    assert 1<cubic.at(35)<3
+    color=Track(ts,[10,50],["#ff0000","#0000ff"])
+    assert np.allclose(color.at(30),[0.5,0,0.5,1])
+    #Drops into the kwargs mechanism, and its table is computed in one vectorized call
+    actor=Recorder(ts=ts,x=pickle.loads(pickle.dumps(x)))
+    actor.precompute(0,60)
+    assert actor.tables["x"].dtype==float
+    actor.draw(PictureBox(10,10,backend='numpy'),20)
+    assert actor.got["x"]==300
+
+
+def test_bind():
+    #The point here is how each kind of signature gets called, so this needs its own actor
+    class Bound(Actor):
+        def _enter(self,pb,tt,alpha=1.0,shadow=False,x=None,y=2,**kwargs):
+            self.got=dict(tt=tt,alpha=alpha,shadow=shadow,x=x,y=y,**kwargs)
+            kwargs["color"]="#ffffff"
+        def _act(self,pb,phase,tt,shadow=False,*,x=None,**kwargs):
+            self.got=dict(phase=phase,tt=tt,shadow=shadow,x=x,**kwargs)
+        def _leave(self,pb,tt,shadow=False,x=None):
+            self.got=dict(tt=tt,shadow=shadow,x=x)
+    pb=PictureBox(10,10,backend='numpy')
+    actor=Bound(ts=[0,10,20,30],x=lambda phase,tt:tt,color="#ff0000",lw=lambda phase,tt:phase)
+    actor.draw(pb,5,shadow=True)
+    assert actor.got==dict(tt=0.5,alpha=1.0,shadow=True,x=0.5,y=2,color="#ff0000",lw=0)
+    actor.draw(pb,6)
+    assert actor.got==dict(tt=0.6,alpha=1.0,shadow=False,x=0.6,y=2,color="#ff0000",lw=0)
+    #Changing a constant kwarg after the first draw takes effect, and so does adding one
+    actor.kwargs["color"]="#00ff00"
+    actor.draw(pb,7)
+    assert actor.got==dict(tt=0.7,alpha=1.0,shadow=False,x=0.7,y=2,color="#00ff00",lw=0)
+    actor.kwargs["y"]=3
+    actor.draw(pb,8)
+    assert actor.got==dict(tt=0.8,alpha=1.0,shadow=False,x=0.8,y=3,color="#00ff00",lw=0)
+    actor.kwargs["y"]=4
+    actor.draw(pb,9)
+    assert actor.got["y"]==4
+    del actor.kwargs["y"]
+    #Keyword-only parameter, so this one is called by keyword
+    actor.draw(pb,15)
+    assert actor.got==dict(phase=1,tt=0.5,shadow=False,x=0.5,color="#00ff00",lw=1)
+    assert actor.bindings["_act"][1] is None
+    #Extra kwargs that _leave can't take are still an error
+    with pytest.raises(TypeError):
+        actor.draw(pb,25)
+
+
+def test_plot():
+    from picturebox import Plot
+    pb=StrokeRecorder(10,10,onscreen=False)
+    data_t=np.array([0.0,1,2,3,4])
+    plot=Plot(ts=[0,10,20,30],px0=0,dx0=0,px1=100,dx1=10,py0=0,dy0=0,py1=100,dy1=10,
+              data_x=data_t*2,data_y=data_t**2,data_t=data_t,t0=0,t1=4)
+    #Halfway through, the line reaches data_t=2 exactly, in one stroke
+    pb.strokes=[]
+    plot.draw(pb,5,shadow=False)
+    assert len(pb.strokes)==1
+    assert np.allclose(pb.strokes[0][0],[0,20,40]) and np.allclose(pb.strokes[0][1],[0,10,40])
+    #Part way along a segment, the last point is interpolated
+    pb.strokes=[]
+    plot.draw(pb,6,shadow=False)
+    assert np.allclose(pb.strokes[0][0],[0,20,40,48]) and np.allclose(pb.strokes[0][1],[0,10,40,60])
+    #Pixels are computed once and reused
+    cache=plot.pixel_cache
+    plot.draw(pb,7,shadow=False)
+    assert plot.pixel_cache is cache
+
+
+def test_decimate():
+    from picturebox import Plot, decimate
+    x=np.arange(1000)/1000
+    y=np.sin(x*1000)
+    keep,starts,ends=decimate(x,y,scale=4)
+    assert list(starts)==[0,250,500,750] and list(ends)==[249,499,749,999]
+    assert len(keep)<=16
+    for a,b in zip(starts,ends):
+        assert a+np.argmin(y[a:b+1]) in keep and a+np.argmax(y[a:b+1]) in keep
+    #Plot draws a dense series with the same extremes as the whole thing, even when cut off part way through a column
+    pb=StrokeRecorder(10,10,onscreen=False)
+    t=np.linspace(0,1,100001)
+    plot=Plot(ts=[0,10,20,30],px0=0,dx0=0,px1=10,dx1=1,py0=0,dy0=-1,py1=10,dy1=1,
+              data_x=t,data_y=np.sin(t*10000),data_t=t,t0=0,t1=1)
+    #Every point is drawn unless decimation is turned on
+    pb.strokes=[]
+    plot.draw(pb,15,shadow=False)
+    assert len(pb.strokes[0][0])==len(t)
+    plot.decimation=16
+    for frame in (5.03,15):
+        pb.strokes=[]
+        plot.draw(pb,frame,shadow=False)
+        (x,y),=pb.strokes
+        n=np.count_nonzero(t<=x[-1])
+        assert len(x)<1000 and x[-1]>=0.5
+        assert np.isclose(y.min(),plot.pixel_cache[4][:n].min()) and np.isclose(y.max(),plot.pixel_cache[4][:n].max())
+        assert np.all(np.diff(x)>=0)
+    #Decimated, it draws nearly the same pixels as every point does
+    frames=[]
+    for decimation in (None,16):
+        pb=PictureBox(200,100,onscreen=False)
+        plot=Plot(ts=[0,10,20,30],px0=0,dx0=0,px1=200,dx1=1,py0=10,dy0=-1,py1=90,dy1=1,
+                  data_x=t,data_y=np.sin(t*300)*np.cos(t*7777),data_t=t,t0=0,t1=1)
+        plot.decimation=decimation
+        plot.draw(pb,15,shadow=False)
+        frames.append(pb.frame().astype(int))
+    diff=np.abs(frames[1]-frames[0]).max(axis=-1)
+    assert np.count_nonzero(diff)<0.01*diff.size and diff.max()<=16
+
+
+def test_tex_cache(tmp_path,monkeypatch):
+    import os
+    from picturebox import tex
+    renders=[]
+    def tex_render(oufn,clean=False,verbose=True,pages=None,fmt=None):
+        renders.append(open(oufn+'.tex').read())
+        return [f"<svg>{len(renders)}</svg>\n","</svg>\n"]
+    monkeypatch.setattr(tex,"tex_render",tex_render)
+    monkeypatch.setattr(tex,"cache_dir",str(tmp_path/"cache"))
+    monkeypatch.setattr(tex,"use_format",False)
+    eqnname=str(tmp_path/"temp")
+    first=tex.eqn2svg("x^2",eqnname)
+    assert tex.eqn2svg("x^2",eqnname)==first and len(renders)==1
+    assert "x^2" in renders[0] and renders[0].startswith(tex.preamble)
+    tex.eqn2svg("y^2",eqnname)
+    assert len(renders)==2
+    #A different preamble is a different key
+    monkeypatch.setattr(tex,"preamble",tex.preamble+"%\n")
+    tex.eqn2svg("x^2",eqnname)
+    assert len(renders)==3
+    #Least recently used goes first
+    monkeypatch.setattr(tex,"preamble",tex.preamble[:-2])
+    y2=tmp_path/"cache"/(tex.cache_key("y^2")+".svg")
+    os.utime(y2,(0,0))
+    tex.cache_evict(2*len("".join(first)))
+    assert len(os.listdir(tmp_path/"cache"))==2 and not y2.exists()
+    assert tex.eqn2svg("x^2",eqnname)==first and len(renders)==3
+    #A cache which can't be touched still gets read
+    def utime(fn):
+        raise PermissionError(fn)
+    monkeypatch.setattr(os,"utime",utime)
+    assert tex.eqn2svg("x^2",eqnname)==first and len(renders)==3
+
+
+def test_eqns2svg(tmp_path,monkeypatch):
+    import os
+    from picturebox import tex
+    tex_render_real=tex.tex_render
+    renders=[]
+    def tex_render(oufn,clean=False,verbose=True,pages=None,fmt=None):
+        renders.append(open(oufn+'.tex').read())
+        return [[f"<svg>{eqn.strip()}</svg>\n"] for eqn in renders[-1].split("$$")[1::2]]
+    monkeypatch.setattr(tex,"tex_render",tex_render)
+    monkeypatch.setattr(tex,"cache_dir",str(tmp_path/"cache"))
+    monkeypatch.setattr(tex,"use_format",False)
+    tex.eqns2svg(["b"])
+    #One run for everything not already cached, and only once for each different equation
+    svgs=tex.eqns2svg(["a","b","c","a"])
+    assert svgs==[["<svg>{a}</svg>\n"],["<svg>{b}</svg>\n"],["<svg>{c}</svg>\n"],["<svg>{a}</svg>\n"]]
+    assert len(renders)==2 and renders[1].count(r"\newpage")==2
+    assert tex.eqns2svg(["c","a"])==[svgs[2],svgs[0]] and len(renders)==2
+    #Typeset in parallel, each worker in its own directory
+    dirs=tmp_path/"dirs"
+    dirs.mkdir()
+    def tex_render(oufn,clean=False,verbose=True,pages=None,fmt=None):
+        (dirs/os.path.basename(os.path.dirname(oufn))).touch()
+        return [[f"<svg>{eqn.strip()}</svg>\n"] for eqn in open(oufn+'.tex').read().split("$$")[1::2]]
+    monkeypatch.setattr(tex,"tex_render",tex_render)
+    eqns=["a","d","e","f","d","g"]
+    svgs=tex.render_many(eqns,workers=2)
+    assert svgs==[[f"<svg>{{{eqn}}}</svg>\n"] for eqn in eqns]
+    assert len(list(dirs.iterdir()))==2
+    assert tex.render_many(eqns,workers=2)==svgs and len(list(dirs.iterdir()))==2
+    #Enough pages that dvisvgm pads the page numbers
+    import sys
+    latex="import sys,shutil;shutil.copy(sys.argv[1],sys.argv[1][:-4]+'.dvi')"
+    dvisvgm=("import sys;base=sys.argv[-1][:-4];pages=open(sys.argv[-1]).read().split('$$')[1::2]\n"
+             "for i,eqn in enumerate(pages):open(f'{base}-{i+1:02d}.svg','w').write(f'<svg>{eqn.strip()}</svg>')")
+    monkeypatch.setattr(tex,"tex_render",tex_render_real)
+    monkeypatch.setattr(tex,"latex_args",lambda base,fmt=None:[sys.executable,"-c",latex,base+".tex"])
+    monkeypatch.setattr(tex,"dvisvgm_args",lambda base,pages=None:[sys.executable,"-c",dvisvgm,base+".dvi"])
+    eqns=[f"x_{i}" for i in range(12)]
+    assert tex.eqns2svg(eqns,cache=False)==[[f"<svg>{{{eqn}}}</svg>"] for eqn in eqns]
+
+
+def test_eqn2svg_async(tmp_path,monkeypatch):
+    import sys, asyncio
+    from picturebox import tex
+    #Stand-ins for latex and dvisvgm, which note when they run in log
+    log=tmp_path/"log"
+    log.mkdir()
+    latex="import sys,shutil;shutil.copy(sys.argv[1],sys.argv[1][:-4]+'.dvi')"
+    dvisvgm=(f"import sys,time,os;t0=time.time();time.sleep(0.05);dvi=open(sys.argv[-1]).read();"
+             f"open(sys.argv[-1][:-4]+'.svg','w').write('<svg>'+dvi.split('$$')[1].strip()+'</svg>\\n');"
+             f"open(os.path.join({str(log)!r},str(os.getpid())),'w').write(f'{{t0}} {{time.time()}}')")
+    monkeypatch.setattr(tex,"latex_args",lambda base,fmt=None:[sys.executable,"-c",latex,base+".tex"])
+    monkeypatch.setattr(tex,"dvisvgm_args",lambda base,pages=None:[sys.executable,"-c",dvisvgm,base+".dvi"])
+    monkeypatch.setattr(tex,"cache_dir",str(tmp_path/"cache"))
+    assert tex.eqn2svg("x",cache=False)==["<svg>{x}</svg>\n"]
+    for path in log.iterdir():
+        path.unlink()
+    async def scene():
+        semaphore=asyncio.Semaphore(2)
+        return await asyncio.gather(*[tex.eqn2svg_async(eqn,semaphore=semaphore) for eqn in "abcde"])
+    assert asyncio.run(scene())==[[f"<svg>{{{eqn}}}</svg>\n"] for eqn in "abcde"]
+    #Never more than two at once
+    spans=[tuple(map(float,path.read_text().split())) for path in log.iterdir()]
+    assert len(spans)==5
+    assert all(sum(t0<=t<t1 for t0,t1 in spans)<=2 for t,_ in spans)
+    #Second time around, it all comes from the cache
+    monkeypatch.setattr(tex,"latex_args",None)
+    assert asyncio.run(tex.eqn2svg_async("c"))==["<svg>{c}</svg>\n"]
+
+
+def test_tex_format(tmp_path,monkeypatch):
+    import sys
+    from picturebox import tex
+    #Stand-ins for latex and dvisvgm. latex notes whether it was given a format, and what the document starts with.
+    latex=("import sys;fmt=[arg for arg in sys.argv if arg.startswith('-fmt=')];tex=open(sys.argv[-1]).read();"
+           "open(sys.argv[-1][:-4]+'.dvi','w').write(str(len(fmt))+' '+tex.split(chr(10))[0])")
+    dvisvgm="import sys;open(sys.argv[-1][:-4]+'.svg','w').write(open(sys.argv[-1]).read())"
+    monkeypatch.setattr(tex,"latex_args",lambda base,fmt=None:[sys.executable,"-c",latex]+(["-fmt="+fmt] if fmt else [])+[base+".tex"])
+    monkeypatch.setattr(tex,"dvisvgm_args",lambda base,pages=None:[sys.executable,"-c",dvisvgm,base+".dvi"])
+    monkeypatch.setattr(tex,"cache_dir",str(tmp_path/"cache"))
+    monkeypatch.setattr(tex,"_formats",{})
+    #Can't build the format, so the document has the whole preamble
+    monkeypatch.setattr(tex,"format_args",lambda base:[sys.executable,"-c","exit(1)"])
+    assert tex.eqn2svg("x",cache=False)==["0 "+tex.preamble.split("\n")[0]]
+    #Built once, then used from the cache
+    monkeypatch.setattr(tex,"_formats",{})
+    monkeypatch.setattr(tex,"format_args",lambda base:[sys.executable,"-c",f"open({base!r}+'.fmt','w').write(open({base!r}+'.ini').read())",base])
+    assert tex.eqn2svg("x",cache=False)==["1 \\batchmode"]
+    fmtfn=tex.tex_format()
+    assert open(fmtfn).read().startswith(r"\documentclass") and r"\dump" in open(fmtfn).read()
+    monkeypatch.setattr(tex,"_formats",{})
+    monkeypatch.setattr(tex,"format_args",None)
+    assert tex.tex_format()==fmtfn
+    #If latex fails with the format, typeset again without it, and don't use it any more
+    import asyncio
+    fails="import sys\nif any(arg.startswith('-fmt=') for arg in sys.argv): sys.exit(1)\n"+latex
+    monkeypatch.setattr(tex,"latex_args",lambda base,fmt=None:[sys.executable,"-c",fails]+(["-fmt="+fmt] if fmt else [])+[base+".tex"])
+    for render in (lambda:tex.eqn2svg("x",cache=False),lambda:asyncio.run(tex.eqn2svg_async("x",cache=False))):
+        monkeypatch.setattr(tex,"_formats",{})
+        assert tex.tex_format()==fmtfn
+        assert render()==["0 "+tex.preamble.split("\n")[0]]
+        assert tex.tex_format() is None
+    #Built only once, even when many threads want it at the same time
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(tex,"cache_dir",str(tmp_path/"cache2"))
+    monkeypatch.setattr(tex,"_formats",{})
+    builds=tmp_path/"builds"
+    builds.mkdir()
+    build=f"import os,time;time.sleep(0.1);open(os.path.join({str(builds)!r},str(os.getpid())),'w');open('eqn.fmt','w')"
+    monkeypatch.setattr(tex,"format_args",lambda base:[sys.executable,"-c",build])
+    with ThreadPoolExecutor(4) as pool:
+        fmtfns=list(pool.map(lambda i:tex.tex_format(),range(4)))
+    assert len(set(fmtfns))==1 and fmtfns[0] is not None and len(list(builds.iterdir()))==1